@@ -1,12 +1,16 @@
 import importlib.metadata
 import logging
+from typing import Annotated
 
 import typer
-from typing_extensions import Annotated
 
+from wikinator.archive import PageArchive
 from wikinator.config import AppConfig, __app_name__
-from wikinator.docxit import DocxitConverter, convert_page
-from wikinator.gdrive import MIMETYPE_DOCX, GoogleDrive
+from wikinator.journal import UploadJournal, journal_file
+from wikinator.pathmatch import PathMatcher
+from wikinator.registry import registry
+from wikinator.throttle import TransportPolicy
+from wikinator.transport import Compression
 from wikinator.wiki import GraphDB as GraphDB
 from wikinator.wiki import GraphIngester
 
@@ -82,6 +86,18 @@ def upload(
     db_url: Annotated[str, typer.Option("--db", help="URL of the GraphQL database")] = app_config.get('db_url'),
     db_token: Annotated[str, typer.Option("--token", help="URL of the GraphQL database")] = app_config.get('db_token'),
     output: Annotated[bool, typer.Option("-o", help="Make a local copy of the converted file")] = False,
+    rate: Annotated[float, typer.Option("--rate", help="Maximum requests per second to the wiki")] = 10.0,
+    retries: Annotated[int, typer.Option("--retries", help="Retries for throttled or failed wiki requests")] = 5,
+    persisted: Annotated[bool, typer.Option("--persisted-queries", help="Send persisted query hashes instead of query text")] = False,
+    compress: Annotated[str | None, typer.Option("--compress", help="Compress large request bodies: gzip or deflate")] = None,
+    resume: Annotated[bool, typer.Option("--resume", help="Continue an interrupted upload, skipping files already uploaded")] = False,
+    prune: Annotated[bool, typer.Option("--prune", help="Delete wiki pages under wikiroot that have no source file. The pages of excluded files and directories are kept")] = False,
+    dry_run: Annotated[bool, typer.Option("--dry-run", help="With --prune, only report the pages that would be deleted")] = False,
+    workers: Annotated[int, typer.Option("--workers", help="Pages uploaded concurrently, while the next files are converted")] = 4,
+    include: Annotated[list[str] | None, typer.Option("--include", help="Only upload files matching this glob (repeatable)")] = None,
+    exclude: Annotated[list[str] | None, typer.Option("--exclude", help="Skip files and directories matching this glob (repeatable)")] = None,
+    output_archive: Annotated[str | None, typer.Option("--output-archive", help="Also write converted pages into one archive: .zip, .tar, .tar.gz or .tar.zst")] = None,
+    aligned_tables: Annotated[bool, typer.Option("--aligned-tables", help="Pad CSV/TSV table columns to line up in the markdown source (reads each table twice)")] = False,
 ) -> None:
     """
     Convert and upload a file hierarchy to a GraphQL wiki.
@@ -93,7 +109,17 @@ def upload(
     For example, with source=/src and wikiroot=/wiki/root,
     a DOCX file at /src/dir/some_file.docx will be uploaded to /wiki/root/dir/some_file on the wiki.
     """
-    GraphIngester(url=db_url, token=db_token, output=output).convert_directory(source, wikiroot)
+    if aligned_tables:
+        registry.register("wikinator.csvtable:load_aligned_file", extensions=[".csv", ".tsv"])
+    policy = TransportPolicy(rate=rate, retries=retries)
+    query_mode = "persisted" if persisted else "compact"
+    compression = Compression(compress) if compress else None
+    journal = UploadJournal(journal_file(app_config.get('config_dir'), source, wikiroot, db_url), resume=resume)
+    GraphIngester(url=db_url, token=db_token, output=output, policy=policy, query_mode=query_mode,
+                  compression=compression, journal=journal,
+                  prune=prune, dry_run=dry_run, workers=workers,
+                  matcher=PathMatcher(include, exclude),
+                  archive=PageArchive(output_archive) if output_archive else None).convert_directory(source, wikiroot)
     raise typer.Exit()
 
 
@@ -118,9 +144,9 @@ def common(
 def convert(
     doc_url: Annotated[str, typer.Argument(help="URL of the google-doc")],
     db_url: Annotated[str, typer.Option("--db", help="URL of the GraphQL database.")] = app_config.get('db_url'),
-    path: Annotated[str, typer.Option("--path", help="Path to upload to. Defaults to '/' (root)")] = None,
-    name: Annotated[str, typer.Option("--name", help="Name of the uploaded file. Defaults to the document title, scrubbed for URL")] = None,
-    token: Annotated[str, typer.Option("--token", help="Secure token for GraphQL database.")] = None, #app_config.get('db_token'),
+    path: Annotated[str | None, typer.Option("--path", help="Path to upload to. Defaults to '/' (root)")] = None,
+    name: Annotated[str | None, typer.Option("--name", help="Name of the uploaded file. Defaults to the document title, scrubbed for URL")] = None,
+    token: Annotated[str | None, typer.Option("--token", help="Secure token for GraphQL database.")] = None, #app_config.get('db_token'),
     skip_confim: Annotated[bool, typer.Option("-y", help="Skip confirmation check when path already exists in wiki")] = False,
 ) -> None:
     """
@@ -141,6 +167,12 @@ def convert(
     if token is None:
         token = app_config.get('db_token')
 
+    # imported here, so other commands don't load the docx converter (gdrive is
+    # already loaded: AppConfig.config_dir imports it)
+    from wikinator.docxit import convert_page
+    from wikinator.gdrive import GoogleDrive
+    from wikinator.registry import MIMETYPE_DOCX
+
     log.info(f"Downloading {doc_url}")
     g_page = GoogleDrive(*app_config.config_dir()).get_doc_url(doc_url, MIMETYPE_DOCX)
 
@@ -176,8 +208,8 @@ def convert(
 
 @app.command()
 def config(
-    name: Annotated[str, typer.Argument(help="Display or set the name of a config value")] = None,
-    value: Annotated[str, typer.Argument(help="If provided, set the supplied name to this value")] = None,
+    name: Annotated[str | None, typer.Argument(help="Display or set the name of a config value")] = None,
+    value: Annotated[str | None, typer.Argument(help="If provided, set the supplied name to this value")] = None,
 ) -> None:
     """
     View or set configuration settings.
@@ -220,12 +252,40 @@ def config(
 #         page.write(destination)
 
 
-# #- teleport : from googledoc -> graphql
-# @app.command()
-# def teleport(
-#     wikiroot: str,
-#     # typer.Option(2, "--priority", "-p", min=1, max=3),
-# ) -> None:
-#     wiki = GraphDB()
-#     for page in GoogleDrive().list_files("application/vnd.google-apps.document"):
-#         wiki.upload(page, wikiroot)
+#- teleport : from googledoc -> graphql
+@app.command()
+def teleport(
+    folder: Annotated[str, typer.Argument(help="ID of the Drive folder or doc to mirror, or / for the whole drive")],
+    wikiroot: str = "/",
+    db_url: Annotated[str, typer.Option("--db", help="URL of the GraphQL database")] = app_config.get('db_url'),
+    db_token: Annotated[str, typer.Option("--token", help="URL of the GraphQL database")] = app_config.get('db_token'),
+    rate: Annotated[float, typer.Option("--rate", help="Maximum requests per second to the wiki")] = 10.0,
+    retries: Annotated[int, typer.Option("--retries", help="Retries for throttled or failed wiki requests")] = 5,
+    exports: Annotated[int, typer.Option("--exports", help="Docs exported from Drive concurrently")] = 8,
+    processes: Annotated[int | None, typer.Option("--processes", help="Processes converting docs, default one per CPU")] = None,
+    workers: Annotated[int, typer.Option("--workers", help="Pages uploaded concurrently")] = 4,
+    changes: Annotated[bool, typer.Option("--changes", help="Only mirror the docs changed since the last --changes run, and delete the pages of removed docs")] = False,
+    spool: Annotated[int, typer.Option("--spool", help="MB of a doc too large for Drive's export kept in memory; beyond that it spills to a temp file")] = 16,
+) -> None:
+    """
+    Mirror the Google Docs under a Drive folder into the wiki, without writing them to disk,
+    except for docs too large for Drive's export call and bigger than --spool MB, which are
+    streamed into a temp file, deleted once converted.
+    Docs are exported, converted and uploaded concurrently, each doc at its path under the
+    folder, relative to wikiroot. For example, with wikiroot=/wiki/root, the doc "Team/Notes/Plan"
+    under the folder "Team" will be uploaded to /wiki/root/Team/Notes/Plan.
+    With --changes, a checkpoint of the Drive changes is kept in the config directory, and later
+    --changes runs only mirror the docs changed since, retry the ones that failed, and delete the
+    wiki pages of docs removed from the folder.
+    """
+    # imported here, so other commands don't load the docx converter (gdrive is
+    # already loaded: AppConfig.config_dir imports it)
+    from wikinator.gdrive import GoogleDrive
+    from wikinator.teleport import Teleporter
+
+    db = GraphDB(db_url, db_token, TransportPolicy(rate=rate, retries=retries))
+    # no export or folder caches: only a doc bigger than --spool is written, to a temp file
+    drive = GoogleDrive(*app_config.config_dir(), cache=False, spool_size=spool * 1024 * 1024)
+    Teleporter(drive, db, export_workers=exports,
+               processes=processes, upload_workers=workers, changes=changes).run(folder, wikiroot)
+    raise typer.Exit()
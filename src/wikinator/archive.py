@@ -0,0 +1,107 @@
+import hashlib
+import io
+import json
+import logging
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+MANIFEST = "manifest.jsonl"
+
+# archive suffix -> tarfile stream mode
+TAR_MODES = {
+    ".tar": "w|",
+    ".tar.gz": "w|gz",
+    ".tgz": "w|gz",
+    ".tar.bz2": "w|bz2",
+    ".tar.xz": "w|xz",
+    ".tar.zst": "w|zst", # python 3.14+
+}
+
+
+def archive_mode(filename:str) -> str:
+    """The tarfile mode for `filename`, or "zip" for a zip file"""
+    name = str(filename).lower()
+    if name.endswith(".zip"):
+        return "zip"
+    for suffix, mode in TAR_MODES.items():
+        if name.endswith(suffix):
+            return mode
+    raise ValueError(f"Unknown archive type: {filename}, expected .zip or one of {', '.join(TAR_MODES)}")
+
+
+class PageArchive:
+    """
+    Writes converted pages, and their images, into a single zip or tar archive
+    as they're produced, instead of one small file each. Tar archives are written
+    as a stream, with the compression given by the file name (.tar.zst, .tar.gz, ...).
+    A manifest.jsonl with one entry per page is written last.
+    """
+    def __init__(self, filename:str):
+        self.filename = Path(filename)
+        self.mode = archive_mode(filename)
+        self.manifest = []
+        self.names = set()
+        self.lock = threading.Lock()
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        if self.mode == "zip":
+            self.archive = zipfile.ZipFile(self.filename, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = tarfile.open(str(self.filename), self.mode) # noqa: SIM115 - closed in close()
+
+
+    def _add(self, name:str, data:bytes):
+        if name in self.names:
+            log.warning(f"{name} is already in {self.filename}, skipping")
+            return
+        self.names.add(name)
+        if self.mode == "zip":
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+
+    def add(self, page):
+        """Add the page markdown at its path, and its images at their wiki paths"""
+        name = str(page.filename()).lstrip("/")
+        content = page.content.encode("utf-8") if isinstance(page.content, str) else page.content
+        images = {}
+        for rId, image in page.images.items():
+            images[page.get_image_path(rId).lstrip("/")] = image.content
+
+        with self.lock:
+            self._add(name, content)
+            for image_name, data in images.items():
+                self._add(image_name, data)
+            self.manifest.append({
+                "path": page.path,
+                "title": page.title,
+                "file": name,
+                "size": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+                "images": list(images),
+            })
+
+
+    def close(self):
+        with self.lock:
+            manifest = "".join(json.dumps(entry) + "\n" for entry in self.manifest)
+            self._add(MANIFEST, manifest.encode("utf-8"))
+            self.archive.close()
+        log.info(f"wrote {len(self.manifest)} pages to {self.filename}")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,41 +1,63 @@
-import os
 import logging
+import os
 from pathlib import Path
 
 from .page import Page
+from .pathmatch import PathMatcher
+from .pipeline import Pipeline, discover, fan_out
+from .registry import registry
 
 log = logging.getLogger(__name__)
 
 class Converter:
     root: Path # Root for file walk, and to resolve rol paths
+    convert_workers: int = 1 # threads converting files
+    store_workers: int = 1 # threads writing or uploading converted pages
+    queue_size: int = 32 # max items waiting between pipeline stages
+    matcher: PathMatcher = None # include/exclude filter for the directory walk
 
 
     def convert(self, infile:Path, outroot:Path) -> Page:
         raise NotImplementedError
 
 
-    def convert_file(self, full_path:Path, outroot:str):
-        ext = full_path.suffix.lower() # TODO strip first char, '.'
-
-        # TODO: generic mapping to queue based on ext.
-        if ext == ".docx":
-            #docx_queue.append(full_path) # TODO async!
-            page = self.convert(full_path, outroot)
-            page.write(outroot)
+    def load(self, full_path:Path, outroot:str):
+        """Convert stage: returns the item to store for `full_path`, or None to skip it"""
+        if registry.can_load(full_path):
+            return self.convert(full_path, outroot)
         else:
-            log.debug(f"No processor for {ext}, skipping {full_path}")
+            log.debug(f"No processor for {full_path.suffix}, skipping {full_path}")
+            return None
 
 
-    def convert_directory(self, inpath:str, outroot:str):
-        # load queues
-        #docx_queue: list[Path] = []
+    def excluded(self, path:Path, is_dir:bool, outroot:str):
+        """Called for each file or directory the matcher leaves out of the walk"""
+
 
+    def store(self, page:Page, outroot:str):
+        """Output stage: write (or upload) an item produced by `load`"""
+        page.write(outroot)
+
+
+    def convert_file(self, full_path:Path, outroot:str):
+        for item in fan_out(self.load(full_path, outroot)):
+            self.store(item, outroot)
+
+
+    def convert_directory(self, inpath:str, outroot:str):
+        """
+        Walk, convert and store the tree at `inpath` as a pipeline, so files are
+        converted while previous ones are being written or uploaded.
+        """
         self.root = Path(inpath)
 
         if os.path.isfile(inpath):
             return self.convert_file(Path(inpath), outroot)
 
-        for root, dirs, files in os.walk(self.root):
-            for file in files:
-                full_path = Path(root, file)
-                self.convert_file(full_path, outroot)
\ No newline at end of file
+        files = discover(self.root, self.matcher, lambda path, is_dir: self.excluded(path, is_dir, outroot))
+        pipeline = Pipeline(files, self.queue_size)
+        pipeline.add_stage("convert", lambda path: self.load(path, outroot), self.convert_workers)
+        pipeline.add_stage("store", lambda item: self.store(item, outroot), self.store_workers)
+        pipeline.run()
+        pipeline.report()
+        return pipeline
@@ -0,0 +1,183 @@
+import csv
+import io
+import logging
+import tempfile
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TextIO
+
+from .page import Page
+
+log = logging.getLogger(__name__)
+
+
+MAX_PAGE_SIZE = 1_000_000 # chars of markdown per page, before the table continues on a new page
+MAX_CELL_WIDTH = 40 # widest column padding in aligned mode
+SPOOL_SIZE = 8 * 1024 * 1024 # rows kept in memory for the second pass, before spilling to disk
+FIELD_SIZE_LIMIT = 16 * 1024 * 1024 # chars in one cell: csv's default is 128k
+
+
+class FieldSizeLimit:
+    """
+    Raise csv's field size limit, which is process-wide, while tables are being read,
+    and restore it once the last one is done. Tables may be read by several threads.
+    """
+    def __init__(self, limit:int):
+        self.limit = limit
+        self.saved = None
+        self.users = 0
+        self.lock = threading.Lock()
+
+
+    def __enter__(self):
+        with self.lock:
+            if self.users == 0:
+                self.saved = csv.field_size_limit(max(self.limit, csv.field_size_limit()))
+            self.users += 1
+
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.users -= 1
+            if self.users == 0:
+                csv.field_size_limit(self.saved)
+
+
+field_size_limit = FieldSizeLimit(FIELD_SIZE_LIMIT)
+
+
+def cell(value:str) -> str:
+    """Escape a value for a markdown table cell"""
+    return value.replace("\\", "\\\\").replace("|", "\\|").replace("\r\n", "<br>").replace("\n", "<br>").strip()
+
+
+def table_row(cells:list[str], widths:list[int] | None = None) -> str:
+    if widths:
+        cells = [value.ljust(width) for value, width in zip(cells, widths)]
+    return "| " + " | ".join(cells) + " |\n"
+
+
+def separator(widths:list[int]) -> str:
+    return "|" + "|".join("-" * (width + 2) for width in widths) + "|\n"
+
+
+class TableWriter:
+    """
+    Builds markdown table pages from rows, starting a new page (repeating the header)
+    when the current one passes `max_size`. Only the page being built is held in memory.
+    """
+    def __init__(self, header:list[str], widths:list[int] | None = None, max_size:int = MAX_PAGE_SIZE):
+        self.columns = len(header)
+        self.widths = widths
+        self.max_size = max_size
+        self.header = table_row(header, widths) + separator(widths or [1] * self.columns)
+        self.buffer = None
+        self.rows = 0
+
+
+    def add(self, cells:list[str]) -> str | None:
+        """Add a row, returning the finished content of the previous page if this row starts a new one"""
+        cells = (cells + [""] * self.columns)[:self.columns] # extra cells aren't rendered anyway
+        line = table_row(cells, self.widths)
+        full = None
+        if self.buffer is not None and self.rows and self.buffer.tell() + len(line) > self.max_size:
+            full = self.finish()
+        if self.buffer is None:
+            self.buffer = io.StringIO()
+            self.buffer.write(self.header)
+            self.rows = 0
+        self.buffer.write(line)
+        self.rows += 1
+        return full
+
+
+    def finish(self) -> str | None:
+        if self.buffer is None:
+            return None
+        content = self.buffer.getvalue()
+        self.buffer = None
+        return content
+
+
+def read_rows(f:TextIO, delimiter:str) -> Iterator[list[str]]:
+    for row in csv.reader(f, delimiter=delimiter):
+        yield [cell(value) for value in row]
+
+
+def spool_rows(rows:Iterator[list[str]], spool:TextIO) -> list[int]:
+    """First pass of aligned mode: copy the rows to `spool`, returning the column widths"""
+    writer = csv.writer(spool, delimiter="\t")
+    widths = []
+    for row in rows:
+        for i, value in enumerate(row):
+            width = min(len(value), MAX_CELL_WIDTH)
+            if i < len(widths):
+                widths[i] = max(widths[i], width)
+            else:
+                widths.append(max(width, 3))
+        writer.writerow(row)
+    spool.seek(0)
+    return widths
+
+
+def table_pages(f:TextIO, delimiter:str = ",", aligned:bool = False, max_size:int = MAX_PAGE_SIZE) -> Iterator[str]:
+    """
+    Stream delimited rows from `f` into markdown table pages of up to about `max_size` chars.
+    Rows are converted as they're read: in aligned mode, rows are spooled (in memory, then
+    on disk) while the column widths are found, and padded on a second pass over the spool.
+    """
+    with field_size_limit:
+        rows = read_rows(f, delimiter)
+        if aligned:
+            with tempfile.SpooledTemporaryFile(SPOOL_SIZE, mode="w+", newline="", encoding="utf-8") as spool:
+                widths = spool_rows(rows, spool)
+                yield from _pages(csv.reader(spool, delimiter="\t"), widths, max_size)
+        else:
+            yield from _pages(rows, None, max_size)
+
+
+def _pages(rows:Iterator[list[str]], widths:list[int] | None, max_size:int) -> Iterator[str]:
+    header = next(rows, None)
+    if header is None:
+        return
+    if widths:
+        widths = (widths + [3] * len(header))[:len(header)]
+    table = TableWriter(header, widths, max_size)
+    for row in rows:
+        content = table.add(row)
+        if content:
+            yield content
+    content = table.finish()
+    yield content if content is not None else table.header
+
+
+def load_file(path:Path, aligned:bool = False, max_size:int | None = None) -> Iterator[Page]:
+    """
+    Convert a CSV or TSV file into markdown table pages, without reading it all into memory.
+    A table bigger than `max_size` is split, continuing on pages at Page.part_path(path, n).
+    """
+    delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+    max_size = max_size or MAX_PAGE_SIZE
+    base = str(Path(path.parent, path.stem))
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        for n, content in enumerate(table_pages(f, delimiter, aligned, max_size), start=1):
+            title = path.stem if n == 1 else f"{path.stem} ({n})"
+            log.debug(f"table page {n} of {path}: {len(content)} chars")
+            yield Page(
+                id = -1,
+                content = content,
+                editor = "markdown",
+                isPublished = True,
+                isPrivate = True,
+                locale = "en",
+                path = base if n == 1 else Page.part_path(base, n),
+                tags = "",
+                title = title,
+                description = f"generated from: {path}",
+            )
+
+
+def load_aligned_file(path:Path) -> Iterator[Page]:
+    """load_file in aligned mode, registered for .csv and .tsv by `upload --aligned-tables`"""
+    return load_file(path, aligned=True)
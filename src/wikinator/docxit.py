@@ -30,23 +30,23 @@
 # All changes in the this version are Copyright (c) 2025, Paul Philion, Acme Rocket Company
 # under the provided MIT license.
 
-import re
-import io
-
-import humanize
-import docx
 import base64
+import io
+import logging
 import os
-from lxml import etree
+import re
+from io import BytesIO
 from pathlib import Path
-import logging
 from typing import Self
-from io import BytesIO
+
+import docx
+import humanize
+from lxml import etree
 from PIL import Image
 
-from .page import Page, PageImage
 from .converter import Converter
-
+from .page import Page, PageImage
+from .registry import registry
 
 log = logging.getLogger(__name__)
 
@@ -141,8 +141,14 @@ def convert_file(docx_file:Path) -> Page:
 
 
 # convert in-memory DOCX page -> in-memory Page
+# the content is the DOCX bytes, or an open file of them, as a large export is streamed to disk
 def convert_page(docx_page:Page) -> Page:
-    doc = docx.Document(io.BytesIO(docx_page.content))
+    content = docx_page.content
+    if isinstance(content, bytes):
+        doc = docx.Document(io.BytesIO(content))
+    else:
+        with content:
+            doc = docx.Document(content)
     return convert(doc, docx_page)
 
 
@@ -733,18 +739,18 @@ class DocxitConverter(Converter):
         return page
 
 
+    @staticmethod
+    def can_load(full_path:Path) -> bool:
+        return registry.can_load(full_path)
+
+
     @staticmethod
     def load_file(full_path:Path) -> Page:
         """
         Given an DOCX file, load the content and convert to MD using
         the Docxit converter. This generates an in-memory Page object
         for the document with all attachments embedded.
-        Given an MD file, just load a page with it.
+        Other file types are loaded with the converter registered for
+        their extension.
         """
-        match full_path.suffix.lower():
-            case ".docx":
-                return convert_file(full_path)
-            case ".md":
-                return Page.load_file(full_path)
-            case _:
-                log.info(f"Skipping, unknown file extension: {full_path}")
+        return registry.load_file(full_path)
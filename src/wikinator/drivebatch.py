@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import Future
+
+from googleapiclient.errors import HttpError
+
+log = logging.getLogger(__name__)
+
+
+MAX_BATCH = 100 # calls per batch request, the Drive API limit
+
+
+class MetadataBatcher:
+    """
+    Groups files().get lookups into batch requests of up to `batch_size` calls.
+    `submit` returns a Future for each id, resolved when its batch is sent: by
+    `flush`, or as soon as `batch_size` lookups are pending. An item that fails
+    (not found, no access...) fails its own future, not the whole batch.
+    With a `scheduler` (a DriveScheduler), each batch counts as one call per
+    lookup against the metadata quota, and lookups that were rate limited
+    are sent again in another batch, after a backoff.
+    """
+    def __init__(self, service, fields:str, batch_size:int = MAX_BATCH, scheduler = None):
+        self.service = service
+        self.scheduler = scheduler
+        self.fields = fields
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.pending = {} # id -> Future
+        self.lock = threading.Lock()
+        self.batches = 0
+
+
+    def submit(self, id:str) -> Future:
+        with self.lock:
+            future = self.pending.get(id)
+            if future is None:
+                future = self.pending[id] = Future()
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+        return future
+
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        attempt = 0
+        while pending:
+            retry = {}
+            delay = 0.0
+
+            def done(request_id, response, exception, pending=pending, retry=retry, attempt=attempt):
+                nonlocal delay
+                future = pending[request_id]
+                if exception is None:
+                    future.set_result(response)
+                    return
+                wait = self._retry_delay(exception, attempt)
+                if wait is None:
+                    future.set_exception(exception)
+                else:
+                    retry[request_id] = future
+                    delay = max(delay, wait)
+
+            batch = self.service.new_batch_http_request(callback=done)
+            for id in pending:
+                batch.add(self.service.files().get(fileId=id, fields=self.fields, supportsAllDrives=True), request_id=id)
+            try:
+                self.batches += 1
+                if self.scheduler:
+                    self.scheduler.call_as("metadata", len(pending), batch.execute)
+                else:
+                    batch.execute()
+            except Exception as ex: # noqa: BLE001 - every waiting lookup must fail, whatever went wrong
+                log.error(f"Batch of {len(pending)} lookups failed: {ex}")
+                for future in pending.values():
+                    if not future.done():
+                        future.set_exception(ex)
+                return
+
+            if retry:
+                log.debug(f"{len(retry)} lookups rate limited, retrying in {delay:.1f}s")
+                time.sleep(delay)
+            pending = retry
+            attempt += 1
+
+
+    def _retry_delay(self, ex:Exception, attempt:int) -> float | None:
+        """Seconds before looking up an item again, or None if it failed for good"""
+        if self.scheduler is None or attempt >= self.scheduler.retries:
+            return None
+        return self.scheduler.retry_delay(ex, attempt)
+
+
+    def get_many(self, ids:Iterable[str]) -> dict[str, dict]:
+        """Metadata for each id, fetched in as few batches as possible. Ids that fail are logged and left out."""
+        futures = {id: self.submit(id) for id in ids}
+        self.flush()
+        results = {}
+        for id, future in futures.items():
+            try:
+                results[id] = future.result()
+            except HttpError as ex:
+                log.warning(f"Error getting id={id}: {ex.status_code} {ex.reason}")
+            except Exception as ex: # noqa: BLE001 - whatever failed the batch
+                log.warning(f"Error getting id={id}: {ex}")
+        return results
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from .throttle import RETRY_STATUS, TokenBucket, TransportPolicy, retry_after
+
+log = logging.getLogger(__name__)
+
+
+# Drive allows 12,000 queries per minute per user: stay under it, with room for other clients
+USER_RATE = 150.0
+# queries per second for each kind of call, within the user rate
+KIND_RATES = {"list": 20.0, "metadata": 100.0, "export": 30.0}
+RATE_LIMIT_REASONS = {"userRateLimitExceeded", "rateLimitExceeded"}
+
+
+def error_reason(ex:HttpError) -> str | None:
+    """The reason code of a Drive error, like "notFound" or "userRateLimitExceeded" """
+    details = ex.error_details
+    if isinstance(details, list) and details and isinstance(details[0], dict):
+        return details[0].get("reason")
+    return None
+
+
+def is_rate_limited(ex:Exception) -> bool:
+    if not isinstance(ex, HttpError):
+        return False
+    return ex.status_code == 429 or (ex.status_code == 403 and error_reason(ex) in RATE_LIMIT_REASONS)
+
+
+class DriveScheduler(TransportPolicy):
+    """
+    TransportPolicy for Drive API calls. On top of the shared rate limit (`rate`,
+    for the per-user quota), each kind of call ("list", "metadata", "export") has
+    its own token bucket, and exports have priority: other calls wait while an
+    export is waiting for the shared bucket. A batch costs one token per call in it.
+    Rate limit errors (403 userRateLimitExceeded/rateLimitExceeded, 429) and 5xx
+    are retried with backoff, or after the server's Retry-After.
+    """
+    def __init__(self, rate:float = USER_RATE, burst:int = 20, rates:dict[str, float] | None = None,
+                 retries:int = 8, base_delay:float = 1.0, max_delay:float = 64.0,
+                 concurrency:int = 16, max_concurrency:int = 32, latency_target:float = 30.0):
+        super().__init__(rate, burst, retries, base_delay, max_delay, concurrency, max_concurrency, latency_target)
+        rates = {**KIND_RATES, **(rates or {})}
+        self.buckets = {kind: TokenBucket(rate, burst) for kind, rate in rates.items()}
+        self.priority = threading.Condition()
+        self.waiting = 0 # exports waiting for the shared bucket
+        self.stats["throttled"] = 0
+
+
+    @staticmethod
+    def _take(bucket:TokenBucket, cost:float):
+        # a batch can cost more than the bucket holds: take it in bursts
+        while cost > 0:
+            tokens = min(cost, bucket.burst)
+            bucket.acquire(tokens)
+            cost -= tokens
+
+
+    def admit(self, kind:str | None = None, cost:float = 1.0):
+        if kind in self.buckets:
+            self._take(self.buckets[kind], cost)
+
+        if kind == "export":
+            with self.priority:
+                self.waiting += 1
+            try:
+                self._take(self.bucket, cost)
+            finally:
+                with self.priority:
+                    self.waiting -= 1
+                    self.priority.notify_all()
+            return
+
+        while cost > 0:
+            tokens = min(cost, self.bucket.burst)
+            with self.priority:
+                while self.waiting:
+                    self.priority.wait()
+                wait = self.bucket.take(tokens)
+            if wait:
+                time.sleep(wait)
+            else:
+                cost -= tokens
+
+
+    def retry_delay(self, ex:Exception, attempt:int) -> float | None:
+        if isinstance(ex, HttpError):
+            if is_rate_limited(ex):
+                self._count("throttled")
+                delay = retry_after(ex.resp.get("retry-after"))
+                if delay is not None:
+                    return min(delay, self.backoff.cap)
+            elif ex.status_code not in RETRY_STATUS:
+                return None
+            return self.backoff.delay(attempt)
+        if isinstance(ex, (httplib2.HttpLib2Error, ConnectionError)):
+            return self.backoff.delay(attempt)
+        return super().retry_delay(ex, attempt)
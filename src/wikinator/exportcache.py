@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import os
+import threading
+import zlib
+from pathlib import Path
+
+from .writer import write_if_changed
+
+log = logging.getLogger(__name__)
+
+
+MAX_CACHE_SIZE = 512 * 1024 * 1024 # bytes, compressed
+
+
+class ExportCache:
+    """
+    Exported document bytes on disk, keyed by (file id, version, export mime type),
+    so a document is only exported again once Drive has a newer version of it.
+    Entries are zlib compressed. When the cache passes `max_size`, the least
+    recently used entries (by file mtime, touched on every hit) are removed.
+    """
+    def __init__(self, directory:str, max_size:int = MAX_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.size = None # bytes on disk, counted on first use
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+
+    @staticmethod
+    def key(file_id:str, version:str, mimeType:str) -> str:
+        return hashlib.sha256(f"{file_id}\n{version}\n{mimeType}".encode()).hexdigest()
+
+
+    def _filename(self, key:str) -> Path:
+        return self.directory / key[:2] / f"{key}.z"
+
+
+    def get(self, file_id:str, version:str, mimeType:str) -> bytes | None:
+        filename = self._filename(self.key(file_id, version, mimeType))
+        try:
+            with open(filename, "rb") as f:
+                data = zlib.decompress(f.read())
+            os.utime(filename) # most recently used
+        except FileNotFoundError:
+            self._stat("misses")
+            return None
+        except (OSError, zlib.error) as ex:
+            log.warning(f"Dropping bad cache entry {filename}: {ex}")
+            filename.unlink(missing_ok=True)
+            self._stat("misses")
+            return None
+        self._stat("hits")
+        return data
+
+
+    def _stat(self, name:str):
+        with self.lock:
+            self.stats[name] += 1
+
+
+    def put(self, file_id:str, version:str, mimeType:str, data:bytes):
+        compressed = zlib.compress(data, 6)
+        filename = self._filename(self.key(file_id, version, mimeType))
+        with self.lock:
+            self._count() # before writing, so the new entry isn't counted twice
+        if not write_if_changed(filename, compressed):
+            return
+        with self.lock:
+            self.size += len(compressed)
+            if self.size > self.max_size:
+                self._evict()
+
+
+    def _entries(self) -> list[os.DirEntry]:
+        entries = []
+        if self.directory.exists():
+            for sub in os.scandir(self.directory):
+                if sub.is_dir():
+                    entries.extend(entry for entry in os.scandir(sub.path) if entry.name.endswith(".z"))
+        return entries
+
+
+    def _count(self):
+        if self.size is None:
+            self.size = sum(entry.stat().st_size for entry in self._entries())
+
+
+    def _evict(self):
+        """Remove the least recently used entries, down to 90% of max_size"""
+        target = self.max_size * 0.9
+        entries = sorted((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path) for entry in self._entries())
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= target:
+                break
+            os.unlink(path)
+            self.size -= size
+            self.stats["evicted"] += 1
+        log.debug(f"export cache evicted down to {self.size} bytes")
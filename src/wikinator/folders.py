@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+
+from .registry import MIMETYPE_FOLDER
+from .writer import write_if_changed
+
+log = logging.getLogger(__name__)
+
+
+NODE_FIELDS = "id,name,parents,mimeType"
+CACHE_MAX_AGE = 24 * 3600 # seconds a saved folder cache is trusted, before folders are fetched again
+
+
+class FolderTree:
+    """
+    Resolves Drive ids into paths ("top/middle/name"), remembering every node
+    it has seen, so the documents in a folder share the lookups of its ancestors.
+    `fetch(id)` returns the metadata (NODE_FIELDS) for ids it hasn't seen, and
+    `fetch_many(ids)`, if given, returns it for many ids at once, as {id: metadata}.
+    Folders are saved to `cache_file`, if given, and reused by later runs for up to
+    `max_age` seconds: a folder renamed since is only noticed if it's seen again.
+    """
+    def __init__(self, fetch:Callable[[str], dict], cache_file:str | None = None,
+                 fetch_many:Callable[[Iterable[str]], dict] | None = None, max_age:float = CACHE_MAX_AGE):
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.cache_file = cache_file
+        self.max_age = max_age
+        self.nodes = {} # id -> (name, parent id, is folder)
+        self.paths = {} # id -> path
+        self.lock = threading.RLock()
+        self.fetched = 0
+        self.load()
+
+
+    def add(self, item:dict) -> tuple:
+        """Remember a node from Drive metadata with (at least) id, name and parents"""
+        parents = item.get("parents") or [None]
+        node = (item["name"], parents[0], item.get("mimeType") == MIMETYPE_FOLDER)
+        with self.lock:
+            old = self.nodes.get(item["id"])
+            if old is not None and old[:2] != node[:2]:
+                self._forget(item["id"]) # renamed or moved
+            self.nodes[item["id"]] = node
+        return node
+
+
+    def _forget(self, id:str):
+        """Drop the paths of `id` and everything below it"""
+        path = self.paths.get(id)
+        if path is None:
+            return # paths are resolved from the top: nothing below it has one either
+        stale = [node_id for node_id, other in self.paths.items() if other == path or other.startswith(path + "/")]
+        for node_id in stale:
+            del self.paths[node_id]
+
+
+    def preload(self, folders:Iterable[dict]):
+        """Remember a listing of folders, like the one from GoogleDrive.list_folders"""
+        count = 0
+        for folder in folders:
+            self.add(folder)
+            count += 1
+        log.info(f"preloaded {count} folders")
+
+
+    def prefetch(self, ids:Iterable[str]):
+        """Fetch the unknown ids, then their unknown parents, and so on: one fetch_many per level"""
+        wanted = {id for id in ids if id and id not in self.nodes}
+        while wanted and self.fetch_many:
+            found = self.fetch_many(wanted)
+            self.fetched += len(found)
+            for item in found.values():
+                self.add(item)
+            wanted = {self.nodes[id][1] for id in found} - set(self.nodes) - {None}
+
+
+    def path(self, id:str) -> str | None:
+        """The path of `id`, including its own name, fetching any ancestors not seen yet"""
+        while True:
+            with self.lock:
+                chain = []
+                current = id
+                missing = None
+                while current and current not in self.paths:
+                    if current in chain:
+                        log.warning(f"Folder cycle at {current}")
+                        break
+                    node = self.nodes.get(current)
+                    if node is None:
+                        missing = current
+                        break
+                    chain.append(current)
+                    current = node[1]
+
+                if missing is None:
+                    prefix = self.paths.get(current) if current else None
+                    for node_id in reversed(chain):
+                        name = self.nodes[node_id][0]
+                        prefix = f"{prefix}/{name}" if prefix else name
+                        self.paths[node_id] = prefix
+                    return self.paths.get(id)
+
+            # fetched without the lock, so one slow request doesn't hold up the other threads
+            item = self.fetch(missing)
+            with self.lock:
+                self.fetched += 1
+            self.add(item)
+
+
+    def item_path(self, item:dict) -> str | None:
+        """The path of an item whose metadata is already known"""
+        self.add(item)
+        return self.path(item["id"])
+
+
+    def load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            age = time.time() - os.path.getmtime(self.cache_file)
+            if age > self.max_age:
+                log.info(f"Folder cache {self.cache_file} is {age / 3600:.0f} hours old, not using it")
+                return
+            with open(self.cache_file, encoding="utf-8") as f:
+                folders = json.load(f)
+            for id, (name, parent) in folders.items():
+                self.nodes[id] = (name, parent, True)
+            log.debug(f"loaded {len(folders)} folders from {self.cache_file}")
+        except (OSError, ValueError) as ex:
+            log.warning(f"Ignoring folder cache {self.cache_file}: {ex}")
+
+
+    def save(self):
+        if not self.cache_file:
+            return
+        with self.lock:
+            folders = {id: [name, parent] for id, (name, parent, folder) in self.nodes.items() if folder}
+        if not write_if_changed(self.cache_file, json.dumps(folders, sort_keys=True)):
+            os.utime(self.cache_file) # still current: trusted for another max_age
@@ -1,16 +1,34 @@
-import os.path
+import functools
+import json
 import logging
+import os.path
 import re
-
+import tempfile
+import threading
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import IO, ClassVar
+
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, MediaIoBaseDownload
 
 from wikinator.config import AppConfig
 
+from .drivebatch import MAX_BATCH, MetadataBatcher
+from .drivequota import DriveScheduler, error_reason
+from .exportcache import ExportCache
+from .folders import NODE_FIELDS, FolderTree
 from .page import Page
+from .registry import MIMETYPE_FOLDER, MIMETYPE_GDOC, MIMETYPE_MARKDOWN
+from .writer import write_if_changed
 
 log = logging.getLogger(__name__)
 
@@ -25,17 +43,65 @@ SCOPES = ["https://www.googleapis.com/auth/drive.readonly", "https://www.googlea
 #     markdown = "text/markdown"
 
 
-MIMETYPE_MARKDOWN = "text/markdown"
-MIMETYPE_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-MIMETYPE_GDOC = "application/vnd.google-apps.document"
-MIMETYPE_FOLDER = "application/vnd.google-apps.folder"
+# Only the metadata needed to find, place and refresh files: the full
+# metadata (fields="*") includes permissions, capabilities, owners...
+FILE_FIELDS = "id,name,mimeType,parents,modifiedTime,version"
+PAGE_SIZE = 1000 # the most files.list returns per request
+PARENTS_PER_QUERY = 25 # folders listed together, keeping the query well under the length limit
+CHUNK_SIZE = 8 * 1024 * 1024 # bytes per ranged request, streaming a large export
+SPOOL_SIZE = 16 * 1024 * 1024 # bytes of a streamed export kept in memory: a bigger one spills to a temp file
+
+
+@functools.cache
+def discovery_document() -> dict | None:
+    """The Drive v3 discovery document bundled with googleapiclient, parsed once per process"""
+    doc = discovery_cache.get_static_doc("drive", "v3")
+    return json.loads(doc) if doc else None
+
+
+def build_drive(**kwargs):
+    """A Drive v3 service, built offline from the bundled discovery document"""
+    doc = discovery_document()
+    if doc is None:
+        return build("drive", "v3", static_discovery=False, cache_discovery=False, **kwargs)
+    return build_from_document(doc, **kwargs)
+
+
+def read_content(content:bytes | IO[bytes]) -> bytes:
+    """The bytes of an export, whether in memory or streamed to a file"""
+    if isinstance(content, bytes):
+        return content
+    with content:
+        return content.read()
 
 
 class GoogleDrive:
-    def __init__(self, config_dir, gcreds):
+    _credentials: ClassVar[dict] = {} # token file -> credentials, shared by every GoogleDrive in the process
+    _credentials_lock = threading.Lock()
+
+
+    def __init__(self, config_dir, gcreds, service = None, cache:bool = True, scheduler:DriveScheduler = None,
+                 spool_size:int = SPOOL_SIZE, http = None):
         self.token_file = os.path.join(config_dir, "token.json")
+        # with cache=False, nothing is written under config_dir: no folders, no exports
+        self.folder_file = os.path.join(config_dir, "drive-folders.json") if cache else None
+        self.checkpoint_file = os.path.join(config_dir, "drive-changes.json")
+        self.removed = [] # ids of files removed or trashed, found by changed_files
+        self.failed = [] # ids of files whose export failed, in export_pages
+        self.export_cache = ExportCache(os.path.join(config_dir, "exports")) if cache else None
+        self._next_token = None
         self.creds = gcreds
-        self.service = self._build_service()
+        self.credentials = None # the user's authorized credentials, shared by all threads
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._service = service # built on first use, unless provided
+        self._injected = service is not None
+        self._http = http # with a provided service, the http object for export downloads
+        self.spool_size = spool_size
+        self._service_lock = threading.Lock()
+        self.scheduler = scheduler or DriveScheduler() # every API call goes through it
+        self._folders = None
+        self._batcher = None
 
 
     @classmethod
@@ -44,40 +110,142 @@ class GoogleDrive:
 
 
     def _validate_token(self):
-        creds = None
-        if os.path.exists(self.token_file):
-            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
-
-        # If there are no (valid) credentials available, let the user log in.
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_config(self.creds, SCOPES)
-                creds = flow.run_local_server(port=0)
-            # Save the credentials for the next run
-            with open(self.token_file, "w") as token:
-                token.write(creds.to_json())
-        return creds
+        with self._credentials_lock:
+            creds = self._credentials.get(self.token_file)
+            if creds is None and os.path.exists(self.token_file):
+                creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
+
+            # If there are no (valid) credentials available, let the user log in.
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    creds.refresh(Request())
+                else:
+                    flow = InstalledAppFlow.from_client_config(self.creds, SCOPES)
+                    creds = flow.run_local_server(port=0)
+                # Save the credentials for the next run
+                with open(self.token_file, "w") as token:
+                    token.write(creds.to_json())
+            self._credentials[self.token_file] = creds
+            return creds
 
 
     def _build_service(self):
         creds = self._validate_token()
-        service = build("drive", "v3", credentials=creds)
+        self.credentials = creds
+        service = build_drive(credentials=creds)
         return service
 
 
+    @property
+    def service(self):
+        """The Drive service, built (and the user authorized) on the first API call"""
+        if self._service is None:
+            with self._service_lock:
+                if self._service is None:
+                    self._service = self._build_service()
+        return self._service
+
+
+    def _thread_service(self):
+        """
+        A service for the current thread: httplib2 isn't thread-safe, so each
+        thread gets its own authorized http object, all sharing one credential.
+        """
+        if self._injected:
+            return self._service # provided by the caller
+        if self.credentials is None:
+            _ = self.service # authorize first
+        service = getattr(self._local, "service", None)
+        if service is None:
+            http = self._local.http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+            service = self._local.service = build_drive(http=http)
+        if not self.credentials.valid:
+            with self._refresh_lock: # refresh once, not once per thread
+                if not self.credentials.valid:
+                    self.credentials.refresh(Request())
+        return service
+
+
+    def _thread_http(self):
+        """The current thread's authorized http object, for requests outside the API client"""
+        if self._injected:
+            return self._http
+        self._thread_service()
+        return self._local.http
+
+
+    def _execute(self, request, kind:str):
+        """Execute an API request through the scheduler, as a "list", "metadata" or "export" call"""
+        return self.scheduler.call_as(kind, 1, request.execute)
+
+
+    @property
+    def folders(self) -> FolderTree:
+        """Cache of folder names and parents, to resolve paths, kept between runs"""
+        if self._folders is None:
+            self._folders = FolderTree(self._get_node, self.folder_file, self.get_metadata)
+        return self._folders
+
+
+    @property
+    def batcher(self) -> MetadataBatcher:
+        """Batches metadata lookups, up to 100 per request"""
+        if self._batcher is None:
+            self._batcher = MetadataBatcher(self.service, NODE_FIELDS, scheduler=self.scheduler)
+        return self._batcher
+
+
+    def get_metadata(self, ids:Iterable[str]) -> dict[str, dict]:
+        """Metadata (NODE_FIELDS) for many ids, in batch requests. Ids that fail are left out."""
+        return self.batcher.get_many(ids)
+
+
+    def resolve_paths(self, items:list[dict]) -> list[str]:
+        """Paths for listed items, fetching all their unknown ancestors in batches"""
+        self.folders.prefetch(parent for item in items for parent in item.get("parents", [])[:1])
+        return [self.folders.item_path(item) for item in items]
+
+
+    def _get_node(self, id:str) -> dict:
+        return self._execute(self.service.files().get(fileId=id, fields=NODE_FIELDS, supportsAllDrives=True), "metadata")
+
+
+    def iter_files(self, query:str, fields:str = FILE_FIELDS) -> Iterator[dict]:
+        """
+        Yield the metadata of the files matching `query`, as each page of results
+        arrives, requesting only `fields` for each file.
+        """
+        request = self.service.files().list(
+            q=query,
+            pageSize=PAGE_SIZE,
+            fields=f"nextPageToken, files({fields})",
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True,
+        )
+        while request is not None:
+            results = self._execute(request, "list")
+            yield from results.get("files", [])
+            request = self.service.files().list_next(request, results)
+
+
+    def list_folders(self) -> Iterator[dict]:
+        """All the folders visible to the user"""
+        return self.iter_files(f"mimeType = '{MIMETYPE_FOLDER}' and trashed = false", NODE_FIELDS)
+
+
+    def preload_folders(self):
+        """Load every folder in one paginated listing, instead of one request per folder"""
+        self.folders.preload(self.list_folders())
+        self.folders.save()
+
+
     def get_parents(self, id) -> str:
+        """The path of `id`, from the top folder down to (and including) its own name"""
         if id is None:
             return None
 
         try:
-            file = self.service.files().get(fileId=id, fields="id,name,parents").execute()
-            # TODO check results
-            name = file['name']
-            parent_id = file.get("parents", [None])[0]
-            parent_name = self.get_parents(parent_id) # recusrion!
-            return parent_name + "/" +  name if parent_name else name
+            return self.folders.path(id)
         except Exception as ex:
             log.error(f"Error getting id={id}: {ex}")
             return None
@@ -102,13 +270,211 @@ class GoogleDrive:
         # should end with a list ["top", "middle", "end"] for "/top/middle/end"
 
 
+    def _checkpoint_file(self, scope:str | None = None) -> str:
+        if scope is None:
+            return self.checkpoint_file
+        base, ext = os.path.splitext(self.checkpoint_file)
+        return f"{base}-{scope}{ext}"
+
+
+    def load_checkpoint(self, scope:str | None = None) -> dict | None:
+        """
+        The checkpoint saved by the last sync, if any: {"pageToken": changes page token,
+        "retry": ids of the files that failed}. Syncs with a `scope` keep their own.
+        """
+        filename = self._checkpoint_file(scope)
+        try:
+            with open(filename, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            if not isinstance(checkpoint, dict) or "pageToken" not in checkpoint:
+                raise ValueError("no pageToken")
+            return checkpoint
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            log.warning(f"Ignoring sync checkpoint {filename}: {ex}")
+            return None
+
+
+    def save_checkpoint(self, token:str, retry:Iterable[str] = (), scope:str | None = None):
+        write_if_changed(self._checkpoint_file(scope), json.dumps({"pageToken": token, "retry": sorted(set(retry))}))
+
+
+    def start_page_token(self) -> str:
+        """A changes page token for "now": changes after this point are listed from it"""
+        return self._execute(self.service.changes().getStartPageToken(supportsAllDrives=True), "list")["startPageToken"]
+
+
+    def changes(self, token:str) -> Iterator[dict]:
+        """
+        The changes since `token`, a page of up to 1000 per request. Once they've all
+        been read, the token to start from next time is in `self._next_token`.
+        """
+        while token:
+            request = self.service.changes().list(
+                pageToken=token,
+                pageSize=PAGE_SIZE,
+                spaces="drive",
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, trashed))",
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+            )
+            response = self._execute(request, "list")
+            yield from response.get("changes", [])
+            if "newStartPageToken" in response:
+                self._next_token = response["newStartPageToken"]
+            token = response.get("nextPageToken")
+
+
+    def changed_files(self, token:str, mimeType:str = MIMETYPE_GDOC) -> Iterator[dict]:
+        """
+        Files of the given type changed since `token`. Removed and trashed file ids
+        are collected in `self.removed`, and changed folders update the folder cache.
+        """
+        for change in self.changes(token):
+            file = change.get("file")
+            if change.get("removed") or file is None or file.get("trashed"):
+                self.removed.append(change["fileId"])
+            elif file["mimeType"] == MIMETYPE_FOLDER:
+                self.folders.add(file)
+            elif file["mimeType"] == mimeType:
+                yield file
+
+
+    def _get_file(self, id:str) -> dict | None:
+        """Metadata (FILE_FIELDS) for a file, or None if it was removed or trashed since"""
+        try:
+            request = self.service.files().get(fileId=id, fields=f"{FILE_FIELDS},trashed", supportsAllDrives=True)
+            item = self._execute(request, "metadata")
+        except HttpError as ex:
+            if ex.status_code != 404:
+                raise
+            item = None
+        if item is None or item.get("trashed"):
+            self.removed.append(id)
+            return None
+        return item
+
+
+    def sync_items(self, mimeType:str = MIMETYPE_GDOC, scope:str | None = None) -> Iterator[dict]:
+        """
+        Files changed since the last sync (all of them, the first time), and the files
+        that failed last time. Once they're all done, finish_sync moves the checkpoint on.
+        A first sync with a `scope` (a folder or file id) only lists the files under it;
+        later ones read the drive's changes, which the caller filters down to the scope.
+        """
+        checkpoint = self.load_checkpoint(scope)
+        if checkpoint is None:
+            log.info("No sync checkpoint, exporting everything")
+            self._next_token = self.start_page_token() # before listing, so nothing is missed
+            yield from self.known_files(scope, mimeType) if scope else self.list_files(mimeType)
+            return
+
+        changed = set()
+        for item in self.changed_files(checkpoint["pageToken"], mimeType):
+            changed.add(item["id"])
+            yield item
+        retry = [id for id in checkpoint.get("retry", []) if id not in changed and id not in self.removed]
+        if retry:
+            log.info(f"retrying {len(retry)} files that failed in the last sync")
+        for id in retry:
+            item = self._get_file(id)
+            if item and item["mimeType"] == mimeType:
+                yield item
+
+
+    def finish_sync(self, failed:Iterable[str] = (), scope:str | None = None):
+        """
+        Move the checkpoint on, to where sync_items stopped reading changes, keeping
+        the `failed` ids: they're retried by the next sync, even if they don't change.
+        """
+        if self._next_token:
+            self.save_checkpoint(self._next_token, failed, scope)
+        if self.removed:
+            log.info(f"{len(self.removed)} files removed since the last sync")
+
+
+    def sync_pages(self, mimeType:str = MIMETYPE_GDOC, workers:int = 8, scope:str | None = None) -> Iterator[Page]:
+        """
+        Pages for the files changed since the last sync: all of them, the first time.
+        The checkpoint is only moved once every page has been consumed, so an
+        interrupted sync is picked up from the same point by the next one, and
+        files whose export failed are tried again next time.
+        """
+        self.failed = []
+        yield from self.export_pages(self.sync_items(mimeType, scope), workers)
+        self.finish_sync(self.failed, scope)
+
+
+    def export(self, item:dict, mimeType:str) -> bytes | IO[bytes]:
+        """
+        Export a file, given its metadata, from the export cache when it has
+        this version of the file, otherwise from Drive. Documents too large for
+        files().export are streamed instead, and returned as an open file.
+        """
+        version = item.get("version") or item.get("modifiedTime")
+        if self.export_cache and version:
+            content = self.export_cache.get(item['id'], version, mimeType)
+            if content is not None:
+                log.debug(f"export cache hit for {item['id']} v{version}")
+                return content
+
+        try:
+            content = self._execute(self._thread_service().files().export(fileId=item['id'], mimeType=mimeType), "export")
+        except HttpError as ex:
+            if error_reason(ex) != "exportSizeLimitExceeded":
+                raise
+            log.info(f"{item.get('name', item['id'])} is too large to export, streaming it")
+            return self.export_stream(item, mimeType)
+
+        if self.export_cache and version:
+            self.export_cache.put(item['id'], version, mimeType, content)
+        return content
+
+
+    def export_stream(self, item:dict, mimeType:str, chunksize:int = CHUNK_SIZE) -> IO[bytes]:
+        """
+        Download an export from the file's exportLinks, in ranged requests of
+        `chunksize` bytes, into a temporary file kept in memory up to `spool_size`
+        bytes: a bigger export spills to disk. Returns the file, rewound. The
+        caller closes it.
+        """
+        service = self._thread_service()
+        links = item.get("exportLinks")
+        if links is None:
+            request = service.files().get(fileId=item['id'], fields="exportLinks", supportsAllDrives=True)
+            links = self._execute(request, "export").get("exportLinks", {})
+        url = links.get(mimeType)
+        if url is None:
+            raise ValueError(f"{item['id']} can't be exported as {mimeType}")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_size) # noqa: SIM115 - returned to the caller
+        try:
+            # the thread's authorized http, so the download is signed like any API call
+            request = HttpRequest(self._thread_http(), lambda response, content: content, url)
+            download = MediaIoBaseDownload(spool, request, chunksize=chunksize)
+            done = False
+            while not done:
+                status, done = self.scheduler.call_as("export", 1, download.next_chunk)
+                if status.total_size:
+                    log.info(f"exporting {item.get('name', item['id'])}: {status.resumable_progress} of {status.total_size} bytes, {status.progress():.0%}")
+                else:
+                    log.info(f"exporting {item.get('name', item['id'])}: {status.resumable_progress} bytes")
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+
     def get_doc(self, doc_id:str, mimeType="text/markdown") -> Page:
         """Download a document given a google ID"""
-        # download
-        metadata = self.service.files().get(fileId=doc_id, fields='id,name,starred').execute()
-        content = self.service.files().export(fileId=doc_id, mimeType=mimeType).execute()
+        # the metadata is cheap, and tells if a cached export is still current
+        metadata = self._execute(self.service.files().get(fileId=doc_id, fields='id,name,starred,version,modifiedTime'), "metadata")
+        content = self.export(metadata, mimeType)
         path = Page.url_safe(metadata['name'])
-        log.debug(f"#### CONTENT: name={path}, size={len(content)}")
+        if isinstance(content, bytes):
+            log.debug(f"#### CONTENT: name={path}, size={len(content)}")
         tags = None
         if metadata['starred']:
             tags = ["starred", "gdocs"]
@@ -143,17 +509,25 @@ class GoogleDrive:
             return self.get_doc(doc_url, mimeType)
 
 
-    def get_page(self, item) -> Page:
-        # FIXME log.info()
-        print(f"getting page for {item['name']}")
-        path = self.get_parents(item['id'])
+    def get_page(self, item, mimeType:str = MIMETYPE_MARKDOWN) -> Page:
+        """
+        Export a listed file (see list_files) as a page: markdown text, or for any other
+        type the exported bytes (or an open file, for a streamed export) to be converted
+        """
+        log.info(f"getting page for {item['name']}")
+        if "parents" in item:
+            path = self.folders.item_path(item)
+        else:
+            path = self.get_parents(item['id'])
 
-        # download
-        content = self.service.files().export(fileId=item['id'], mimeType="text/markdown").execute()
+        content = self.export(item, mimeType)
+        if mimeType == MIMETYPE_MARKDOWN:
+            content = read_content(content).decode("utf-8")
         return Page(
+            id = item['id'],
             title = item['name'],
             path = path,
-            content = content.decode("utf-8"),
+            content = content,
             editor = "markdown",
             locale = "en",
             tags = None,
@@ -193,104 +567,115 @@ class GoogleDrive:
 
 
     def get_item(self, id:str):
-        return self.service.files().get(fileId=id).execute()
+        return self._execute(self.service.files().get(fileId=id), "metadata")
+
 
     def get_children(self, id:str) -> list:
-        kids = []
-        # FIXME
-        # query = f"'{id}' in parents"
-        # response = self.service.files().list(q=query).execute()
-        # files.append(response.get('files'))
-        # nextPage = response.get("nextPageToken")
-        # while nextPage:
-        #     response = self.service.files().list(q=query).execute()
-        #     files.append(response.get('files'))
-        #     nextPage = response.get("nextPageToken")
-        return kids
-
-
-    def list_files(self, mimeType:str) -> list[Page]:
+        """The files and folders directly in folder `id`"""
+        return list(self.iter_files(f"'{id}' in parents and trashed = false"))
+
+
+    def list_files(self, mimeType:str) -> Iterator[dict]:
         """
-        produce a list a file IDs that match the give file
-        type
+        Lazily list the files of the given type. Nothing is exported:
+        pass the items to `pages` (or `get_page`) for that.
         """
-        pages = []
+        return self.iter_files(f"mimeType = '{mimeType}' and trashed = false")
 
-        query = f"mimeType = '{mimeType}'"
-        request = self.service.files().list(pageSize=10, q=query, fields="*")
-        while request is not None:
-            results = request.execute()
-            items = results.get("files", [])
-            for item in items:
-                #print(json.dumps(item, indent=4))
-                #path = self.get_parents(id)
-                page = self.get_page(item)
-                #print(page.path)
-                pages.append(page)
-            request = self.service.files().list_next(request, results)
 
-        return pages
+    def pages(self, items:Iterable[dict]) -> Iterator[Page]:
+        """Export each listed file as it's needed, resolving folders for up to 100 files at a time"""
+        for chunk in self._resolved_chunks(items):
+            for item in chunk:
+                yield self.get_page(item)
+        self.folders.save()
+
 
+    def _resolved_chunks(self, items:Iterable[dict]) -> Iterator[list[dict]]:
+        """Items in chunks of up to 100, with the folders for each chunk resolved in batches"""
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == MAX_BATCH:
+                self.resolve_paths(chunk)
+                yield chunk
+                chunk = []
+        if chunk:
+            self.resolve_paths(chunk)
+            yield chunk
 
-    def known_files(self, id:str) -> list[str]:
+
+    def export_pages(self, items:Iterable[dict], workers:int = 8) -> Iterator[Page]:
+        """
+        Export listed files on `workers` threads, yielding pages as they complete
+        (not in listing order). At most 2 x workers exports are in flight or
+        waiting to be consumed. Exports that fail are logged, skipped and their ids
+        added to `self.failed`.
+        """
+        submitted = {} # future -> item
+
+        def results(done):
+            for future in done:
+                item = submitted.pop(future)
+                try:
+                    yield future.result()
+                except Exception as ex: # noqa: BLE001 - one bad export mustn't stop the rest
+                    log.error(f"Export of {item['id']} failed: {ex}")
+                    self.failed.append(item['id'])
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+            pending = set()
+            for chunk in self._resolved_chunks(items):
+                for item in chunk:
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from results(done)
+                    future = pool.submit(self.get_page, item)
+                    submitted[future] = item
+                    pending.add(future)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from results(done)
+        self.folders.save()
+
+
+    def walk(self, folder_id:str, mimeType:str = MIMETYPE_GDOC) -> Iterator[dict]:
+        """
+        Yield the files of type `mimeType` (all files, if None) anywhere under a folder,
+        breadth-first. The children of up to PARENTS_PER_QUERY folders are listed by one
+        query, and files are yielded as each page of results arrives.
+        """
+        pending = deque([folder_id])
+        folders = 0
+        while pending:
+            group = [pending.popleft() for _ in range(min(PARENTS_PER_QUERY, len(pending)))]
+            query = "(" + " or ".join(f"'{id}' in parents" for id in group) + ") and trashed = false"
+            for item in self.iter_files(query):
+                self.folders.add(item)
+                if item["mimeType"] == MIMETYPE_FOLDER:
+                    pending.append(item["id"])
+                    folders += 1
+                elif mimeType is None or item["mimeType"] == mimeType:
+                    yield item
+        log.info(f"walked {folders} folders under {folder_id}")
+        self.folders.save()
+
+
+    def known_files(self, id:str, mimeType:str = MIMETYPE_GDOC) -> Iterator[dict]:
         """
         id can be '/', to start at the root,
-        or the ID of a folder or a file
-
+        or the ID of a folder or a file.
+        Yields the google docs found: the file itself, or every doc under the folder.
         """
-        # iterate over the known files,
-        # generating a page with the contents of each
-
-        pages = []
-        #mimeType = MimeType.gdoc
-
         try:
-            #service = get_service()
-            #print("got service:", service)
-            #files = service.files()
-            #print("---", files, type(files))
-            # IF url, strip out ID
-            #file = service.files().get(fileId=url).execute()
-            #print("->>", file)
-
-            #request = service.files().list(pageSize=20, fields=f"nextPageToken, files(mimeType='${MimeType.gdoc}')")
-            #request = self.service.files().list(pageSize=20, fields="nextPageToken, files(*)")
-            #request = self.service.files().list(q="mimeType='${MimeType.gdoc}'")
-            request = self.service.files().list(pageSize=100, q=f"mimeType = '{MIMETYPE_FOLDER}'")
-
-
-
-            while request is not None:
-                results = request.execute()
-
-                items = results.get("files", [])
-                if not items:
-                    log.debug("No files found.")
-                    return
-                for item in items:
-                    #print(json.dumps(item, indent=4))
-                    #print(item['id'], item['name'], item['mimeType'])
-
-                    if item['mimeType'] == MIMETYPE_GDOC:
-                        # download
-                        #page = self.get_page(item)
-                        pages.append(item)
-                    elif item['mimeType'] == MIMETYPE_FOLDER:
-                        print("TODO - download folder, name:", item['name'], ", id:", item['name'])
-                        pages.extend()
-                    elif item['mimeType'].startswith("image/") or item['mimeType'].startswith("video/"):
-                        print(".", end="")
-                    else:
-                        #print('.', end='')
-                        print("skipping", item['name'], item['mimeType'])
-
-                request = self.service.files().list_next(request, results)
-
+            item = self._get_node("root" if id == "/" else id)
+            self.folders.add(item)
+            if item["mimeType"] != MIMETYPE_FOLDER:
+                yield item
+            else:
+                yield from self.walk(item["id"], mimeType)
         except HttpError as error:
-            # TODO(developer) - Handle errors from drive API.
-            print(f"An error occurred: {error}")
-
-        return pages
+            log.error(f"Error listing {id}: {error}")
 
 
 # def main():
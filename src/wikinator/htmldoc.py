@@ -1,21 +1,19 @@
+import logging
+import re
 import sys
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
 from typing import override
+from urllib.parse import urlsplit
 
 import requests
-
 from bs4 import BeautifulSoup
-
+from markdownify import MarkdownConverter
 from markdownify import markdownify as md
 
-import re
-from collections import defaultdict
-import logging
-from datetime import datetime
-from abc import ABC, abstractmethod
-
-from urllib.parse import urlsplit
-
 from wikinator.page import Page
+from wikinator.registry import registry
 
 log = logging.getLogger(__name__)
 
@@ -34,10 +32,12 @@ def download_html(url):
     return response.text
 
 
+NON_WORD = re.compile(r"[^\w]+")
+
+
 def make_md_anchor(text, counter):
-    text = text.lower()
-    text = re.sub(r"[^\w]+", "-", text)
-    text = re.sub(r"-+", "-", text).strip("-")
+    # a run of non-word characters (dashes included) becomes a single dash
+    text = NON_WORD.sub("-", text.lower()).strip("-")
 
     count = counter[text]
     counter[text] += 1
@@ -46,14 +46,20 @@ def make_md_anchor(text, counter):
     return f"#{text}"
 
 
-def dl_to_ul(dl_tag, anchor_map, anchor_counter, text_counter):
-    ul = BeautifulSoup("<ul></ul>", "lxml").ul
+def dl_to_ul(dl_tag, anchor_map, anchor_counter, text_counter, soup=None):
+    """
+    Rewrite a (nested) definition list TOC as a list of markdown links, with
+    new tags from `soup`, the document dl_tag is in.
+    """
+    if soup is None:
+        soup = next(parent for parent in dl_tag.parents if isinstance(parent, BeautifulSoup))
+    ul = soup.new_tag("ul")
 
     for child in dl_tag.children:
         if child.name != "dt":
             continue
 
-        li = BeautifulSoup("<li></li>", "lxml").li
+        li = soup.new_tag("li")
         a_tag = child.find("a")
 
         if a_tag:
@@ -81,15 +87,19 @@ def dl_to_ul(dl_tag, anchor_map, anchor_counter, text_counter):
         if next_sib and next_sib.name == "dd":
             inner_dl = next_sib.find("dl")
             if inner_dl:
-                li.append(dl_to_ul(inner_dl, anchor_map, anchor_counter, text_counter))
+                li.append(dl_to_ul(inner_dl, anchor_map, anchor_counter, text_counter, soup))
 
         ul.append(li)
 
     return ul
 
 
-def preprocess_html(html):
-    soup = BeautifulSoup(html, 'html.parser')
+def parse_html(html) -> BeautifulSoup:
+    return BeautifulSoup(html, 'html.parser')
+
+
+def preprocess_soup(soup:BeautifulSoup) -> BeautifulSoup:
+    """Drop scripts and styles, and point the TOC links at markdown heading anchors, in place"""
     anchor_map = {}
     text_counter = defaultdict(int)
 
@@ -106,15 +116,29 @@ def preprocess_html(html):
             anchor_map[orig_anchor] = md_anchor
             a_tag.decompose()
 
-    for dl in list(soup.find_all("dl")):
-        dl.replace_with(dl_to_ul(dl, anchor_map, text_counter, text_counter))
+    # nested lists are rewritten along with the list they're in
+    for dl in [dl for dl in soup.find_all("dl") if dl.find_parent("dl") is None]:
+        dl.replace_with(dl_to_ul(dl, anchor_map, text_counter, text_counter, soup))
 
-    return soup.prettify()
+    return soup
+
+
+def preprocess_html(html):
+    return str(preprocess_soup(parse_html(html)))
+
+
+def get_title(soup:BeautifulSoup) -> str | None:
+    return soup.title.get_text() if soup.title else None
 
 
 def get_title_from_html(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    return soup.find_all('title')[0].get_text()
+    return get_title(parse_html(html))
+
+
+def soup_to_markdown(soup:BeautifulSoup) -> str:
+    """Markdown straight from the parsed tree, without rendering it back to HTML first"""
+    markdown = MarkdownConverter(heading_style="ATX", bullets="*").convert_soup(soup)
+    return markdown.replace("\u00A0", " ")
 
 
 def html_to_markdown(html):
@@ -130,10 +154,7 @@ def convert_to_markdown(url):
     # Seperate download from processing
     # download should include filetype
     html = download_html(url)
-    html = preprocess_html(html)
-    markdown = html_to_markdown(html)
-    markdown = markdown.replace("\u00A0", " ")
-    return markdown
+    return soup_to_markdown(preprocess_soup(parse_html(html)))
 
 
 # document - the specific page. maps to page eventually
@@ -170,7 +191,7 @@ def path_from_url(full_url:str):
 
 
 class Document:
-    def __init__(self, url:str, type:str, content:bytes, title:str=None):
+    def __init__(self, url:str, type:str, content:bytes, title:str | None=None):
         self.url = url
         self.created = datetime.now()
         self.type = type
@@ -194,12 +215,11 @@ class DocumentConverter(ABC):
 class HtmlConverter(DocumentConverter):
     @override
     def convert(self, doc:Document) -> Page:
-        title = get_title_from_html(doc.content)
+        # one parse, shared by the title, the anchor rewriting and the markdown
+        soup = parse_html(doc.content)
+        title = get_title(soup)
         path = path_from_url(doc.url)
-
-        content = preprocess_html(doc.content)
-        markdown = html_to_markdown(content)
-        markdown = markdown.replace("\u00A0", " ")
+        markdown = soup_to_markdown(preprocess_soup(soup))
 
         return Page.load({
             'content': markdown,
@@ -235,20 +255,10 @@ class FolderConverter(DocumentConverter):
 
 default_converter = PassthruConverter()
 
-converters = {
-    'text/html': HtmlConverter(),
-    'text/markdown': default_converter,
-    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': DocxConverter(),
-    'application/vnd.google-apps.document': DocxConverter(),
-    'application/vnd.google-apps.folder': FolderConverter(),
-    # PDF - extract text and ocr, render page images?
-    # CSV - MD tables? keep both
-}
-
 
 def get_page(url:str) -> Page:
     doc = get_document(url)
-    converter = converters.get(doc.type, default_converter)
+    converter = registry.get(doc.type) or default_converter
     log.warning(f"selected {type(converter)} for {doc.type}")
     return converter.convert(doc)
 
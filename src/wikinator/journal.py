@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+def content_hash(filename:Path, chunk_size:int = 1024 * 1024) -> str:
+    """sha256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def journal_file(journal_dir:str, source:str, wikiroot:str, url:str) -> Path:
+    """The journal for uploading `source` to `wikiroot` on the wiki at `url`"""
+    key = f"{os.path.abspath(source)}|{wikiroot}|{url}"
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return Path(journal_dir, "journals", f"upload-{name}.jsonl")
+
+
+class UploadJournal:
+    """
+    Append-only journal of completed uploads, one JSON line per file:
+        {"path": source path, "id": wiki page id, "hash": content hash}
+    Entries are buffered and written with an fsync every `batch_size` entries
+    (or `interval` seconds), so an interrupted run loses at most one batch.
+    """
+    def __init__(self, filename:Path, resume:bool = False, batch_size:int = 50, interval:float = 5.0):
+        self.filename = Path(filename)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.completed = self.replay() if resume else {}
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        if resume:
+            self._drop_torn_tail()
+        self.file = open(self.filename, "a" if resume else "w", encoding="utf-8") # noqa: SIM115 - closed in close()
+        if self.completed:
+            log.info(f"Resuming from {self.filename}: {len(self.completed)} files already uploaded")
+
+
+    def replay(self) -> dict[str, dict]:
+        """Read the completed entries of a previous run, indexed by path"""
+        completed = {}
+        if not self.filename.exists():
+            return completed
+
+        with open(self.filename, encoding="utf-8") as file:
+            for lineno, line in enumerate(file, 1):
+                try:
+                    entry = json.loads(line)
+                    completed[entry["path"]] = entry
+                except (json.JSONDecodeError, KeyError):
+                    # expected for the last line if the previous run died mid-write
+                    log.warning(f"Ignoring damaged journal entry {self.filename}:{lineno}")
+        return completed
+
+
+    def _drop_torn_tail(self, chunk_size:int = 4096):
+        """
+        Cut off a last line left unfinished by a run that died mid-write, so the
+        next entry starts on a line of its own instead of being appended to it.
+        """
+        try:
+            with open(self.filename, "rb+") as file:
+                end = file.seek(0, os.SEEK_END)
+                pos = end
+                while pos > 0:
+                    start = max(0, pos - chunk_size)
+                    file.seek(start)
+                    newline = file.read(pos - start).rfind(b"\n")
+                    if newline >= 0:
+                        pos = start + newline + 1
+                        break
+                    pos = start
+                if pos < end:
+                    log.warning(f"Dropping {end - pos} bytes of a damaged entry at the end of {self.filename}")
+                    file.truncate(pos)
+        except FileNotFoundError:
+            pass
+
+
+    def is_done(self, path:str, hash:str) -> bool:
+        """True if `path` was already uploaded with the same content"""
+        entry = self.completed.get(str(path))
+        return entry is not None and entry.get("hash") == hash
+
+
+    def record(self, path:str, page_id:int, hash:str):
+        entry = {"path": str(path), "id": page_id, "hash": hash}
+        with self.lock:
+            self.completed[entry["path"]] = entry
+            self.pending.append(json.dumps(entry))
+            if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush > self.interval:
+                self._flush()
+
+
+    def _flush(self):
+        if self.pending:
+            self.file.write("\n".join(self.pending) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = []
+        self.last_flush = time.monotonic()
+
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
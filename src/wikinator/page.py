@@ -1,9 +1,10 @@
 import json
-from pathlib import Path
 import logging
-import re
 import os
+import re
+from pathlib import Path
 
+from .writer import write_if_changed
 
 log = logging.getLogger(__name__)
 
@@ -141,6 +142,12 @@ class Page:
         return value
 
 
+    @staticmethod
+    def part_path(path:str, n:int) -> str:
+        """Path for part `n` (from 2) of a source file split over several pages"""
+        return f"{path}_part{n}"
+
+
     def fullpath(self, path:str) -> str:
         if path:
             fullpath = str(Path(path, self.path))
@@ -168,17 +175,11 @@ class Page:
 
     def write_file(self, filename:str) -> None:
         """
-        write content and metadata to specified file
+        write content and metadata to specified file,
+        replacing it atomically, and only if it changed
         """
-        target = Path(filename)
-
-        # assure required dirs exist
-        target.parent.mkdir(parents=True, exist_ok=True)
-
-        # write the content
-        with open(target, 'w') as output_file:
-            # TODO write yaml-based meta data
-            output_file.write(self.content)
+        # TODO write yaml-based meta data
+        write_if_changed(Path(filename), self.content)
 
 
     def write(self, root:str) -> None:
@@ -196,7 +197,8 @@ class Page:
 
 
     def vars(self):
-        temp = vars(self)
+        # copy, so the page keeps its comments and images
+        temp = dict(vars(self))
         del temp["comments"]
         del temp["images"]
         return temp
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import logging
+import re
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+IGNORE_FILE = ".wikinatorignore"
+
+
+def translate(pattern:str) -> str:
+    """Regex for a glob: `*` and `?` stay within a path segment, `**` spans segments"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        c = pattern[i]
+        end = pattern.find("]", i + 2) if c == "[" else -1
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif end > 0:
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+def pattern_regex(pattern:str, base:str = "") -> str:
+    """
+    Regex matching paths relative to the walk root, gitignore style:
+    - a pattern without a `/` matches a name at any depth below `base`
+    - a pattern with a `/` is anchored at `base`
+    - a trailing `/` only matches directories (which are matched with a trailing `/`)
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    prefix = re.escape(base + "/") if base else ""
+    if not anchored:
+        prefix += "(?:.*/)?"
+    return prefix + translate(pattern) + ("/" if dir_only else "/?")
+
+
+def read_ignore_file(filename:Path) -> list[str]:
+    """Patterns in an ignore file, one per line, skipping blanks and # comments"""
+    patterns = []
+    try:
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    patterns.append(line)
+    except OSError as ex:
+        log.warning(f"Unable to read {filename}: {ex}")
+    return patterns
+
+
+class PathMatcher:
+    """
+    Include and exclude globs, compiled once into a single regex each.
+    Excludes apply to files and directories; an excluded directory isn't walked at all.
+    Includes only apply to files: with no includes, every file that isn't excluded is included.
+    """
+    def __init__(self, include:list[str] | None = None, exclude:list[str] | None = None):
+        self._includes = [pattern_regex(p) for p in include or []]
+        self._excludes = [pattern_regex(p) for p in exclude or []]
+        self._include = self._compile(self._includes)
+        self._exclude = self._compile(self._excludes)
+
+
+    @staticmethod
+    def _compile(regexes:list[str]) -> re.Pattern | None:
+        if not regexes:
+            return None
+        return re.compile("|".join(f"(?:{r})" for r in regexes) if len(regexes) > 1 else regexes[0])
+
+
+    def with_excludes(self, patterns:list[str], base:str = "") -> PathMatcher:
+        """A matcher for the subtree at `base`, adding excludes relative to it (from an ignore file)"""
+        matcher = PathMatcher()
+        matcher._includes = self._includes
+        matcher._include = self._include
+        matcher._excludes = self._excludes + [pattern_regex(p, base) for p in patterns]
+        matcher._exclude = self._compile(matcher._excludes)
+        return matcher
+
+
+    def excluded(self, path:str, is_dir:bool = False) -> bool:
+        """True if `path`, relative to the walk root, is excluded"""
+        if self._exclude is None:
+            return False
+        return self._exclude.fullmatch(path + "/" if is_dir else path) is not None
+
+
+    def included(self, path:str) -> bool:
+        """True if the file `path`, relative to the walk root, should be converted"""
+        if self.excluded(path):
+            return False
+        return self._include is None or self._include.fullmatch(path) is not None
@@ -0,0 +1,194 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+from .pathmatch import IGNORE_FILE, PathMatcher, read_ignore_file
+
+log = logging.getLogger(__name__)
+
+
+_DONE = object() # end-of-input marker, one per worker
+
+
+def discover(root:Path, matcher:PathMatcher = None,
+             excluded:Callable[[Path, bool], None] | None = None) -> Iterable[Path]:
+    """
+    Walk the tree at `root` with os.scandir, yielding files as they're found.
+    Excluded directories are skipped without being read, and each directory's
+    .wikinatorignore adds excludes for the tree below it. `excluded(path, is_dir)`,
+    if given, is called for each file and directory left out.
+    """
+    matcher = matcher or PathMatcher()
+    stack = [(Path(root), "", matcher)]
+    while stack:
+        directory, rel, matcher = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError as ex:
+            log.warning(f"Unable to read {directory}: {ex}")
+            continue
+
+        if any(entry.name == IGNORE_FILE for entry in entries):
+            matcher = matcher.with_excludes(read_ignore_file(directory / IGNORE_FILE), rel)
+
+        for entry in entries:
+            path = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if matcher.excluded(path, is_dir=True):
+                        log.debug(f"Excluded {entry.path}")
+                        if excluded:
+                            excluded(Path(entry.path), True)
+                    else:
+                        stack.append((Path(entry.path), path, matcher))
+                elif entry.is_file() and entry.name != IGNORE_FILE:
+                    if matcher.included(path):
+                        yield Path(entry.path)
+                    elif excluded:
+                        excluded(Path(entry.path), False)
+            except OSError as ex:
+                log.warning(f"Unable to read {entry.path}: {ex}")
+
+
+def fan_out(result) -> Iterable:
+    """The items of a stage result: none for None, each item of a list or iterator, or the result itself"""
+    if result is None:
+        return ()
+    if isinstance(result, (list, Iterator)):
+        return result
+    return (result,)
+
+
+class Stage:
+    """
+    A pipeline stage: `workers` threads calling `func` on each item from the
+    stage's input queue. A result of None is dropped, a list or iterator is
+    passed on item by item, and anything else is passed on to the next stage.
+    Items from an iterator are produced as the next stage has room for them.
+    """
+    def __init__(self, name:str, func:Callable, workers:int = 1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.count = 0
+        self.errors = 0
+        self.busy = 0.0 # seconds spent in func, summed over workers
+        self.lock = threading.Lock()
+
+
+    def record(self, elapsed:float, error:bool = False):
+        with self.lock:
+            self.count += 1
+            self.busy += elapsed
+            if error:
+                self.errors += 1
+
+
+    def rate(self, wall:float) -> float:
+        """Items per second of wall time"""
+        return self.count / wall if wall > 0 else 0.0
+
+
+    def __str__(self):
+        return f"{self.name}: {self.count} items, {self.errors} errors, {self.busy:.2f}s busy"
+
+
+class Pipeline:
+    """
+    Run items from `source` through a chain of stages, each stage in its own
+    threads, connected by queues of at most `maxsize` items. A full queue blocks
+    the stage feeding it, so a slow stage holds back the ones before it instead
+    of piling up work in memory.
+    """
+    def __init__(self, source:Iterable, maxsize:int = 32):
+        self.source = source
+        self.maxsize = maxsize
+        self.stages = []
+        self.discovered = 0
+        self.wall = 0.0
+        self.stop = threading.Event()
+
+
+    def add_stage(self, name:str, func:Callable, workers:int = 1) -> Stage:
+        stage = Stage(name, func, workers)
+        self.stages.append(stage)
+        return stage
+
+
+    def _put(self, q:queue.Queue, item) -> bool:
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+    def _timed_put(self, q:queue.Queue, item) -> float:
+        """Put `item` on `q`, returning the seconds spent waiting for room"""
+        start = time.perf_counter()
+        self._put(q, item)
+        return time.perf_counter() - start
+
+
+    def _work(self, stage:Stage, inbox:queue.Queue, outbox:queue.Queue | None):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            if self.stop.is_set():
+                continue # drain
+
+            start = time.perf_counter()
+            waited = 0.0 # blocked on the next stage, not counted as busy
+            try:
+                for out in fan_out(stage.func(item)):
+                    if outbox is not None:
+                        waited += self._timed_put(outbox, out)
+                stage.record(time.perf_counter() - start - waited)
+            except Exception:
+                log.exception(f"{stage.name} failed on {item}")
+                stage.record(time.perf_counter() - start - waited, error=True)
+
+
+    def run(self):
+        start = time.perf_counter()
+        queues = [queue.Queue(self.maxsize) for _ in self.stages]
+        threads = []
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            workers = [threading.Thread(target=self._work, args=(stage, queues[i], outbox),
+                                        name=f"{stage.name}-{n}", daemon=True)
+                       for n in range(stage.workers)]
+            for worker in workers:
+                worker.start()
+            threads.append(workers)
+
+        try:
+            for item in self.source:
+                if not self._put(queues[0], item):
+                    break
+                self.discovered += 1
+        except BaseException:
+            self.stop.set()
+            raise
+        finally:
+            # shut down in order, so each stage sees all of its input first
+            for i, stage in enumerate(self.stages):
+                for _ in threads[i]:
+                    queues[i].put(_DONE)
+                for worker in threads[i]:
+                    worker.join()
+            self.wall = time.perf_counter() - start
+
+
+    def report(self):
+        log.info(f"discovered {self.discovered} files in {self.wall:.2f}s")
+        for stage in self.stages:
+            log.info(f"{stage}, {stage.rate(self.wall):.1f} items/s")
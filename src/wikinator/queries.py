@@ -0,0 +1,185 @@
+import functools
+import hashlib
+import logging
+
+from gql import GraphQLRequest
+from graphql import parse
+from graphql.utilities import strip_ignored_characters
+
+log = logging.getLogger(__name__)
+
+
+# How operations are sent to the server:
+# - "compact": the operation text, stripped of whitespace and formatting
+# - "persisted": automatic persisted queries (APQ, supported by the apollo server
+#   behind wiki.js), sending only the sha256 of the operation once the server knows it.
+QUERY_MODES = ["compact", "persisted"]
+
+
+class PreparedRequest(GraphQLRequest):
+    """
+    A GraphQL request for a PreparedQuery. The payload uses the text printed
+    once for the query, instead of re-printing the document on every request.
+    """
+    def __init__(self, query, variable_values:dict | None = None, persisted:bool = False, send_query:bool = True):
+        super().__init__(query.document, variable_values=variable_values)
+        self.query = query
+        self.persisted = persisted
+        self.send_query = send_query
+
+
+    @property
+    def payload(self) -> dict:
+        payload = {}
+        if self.send_query:
+            payload["query"] = self.query.text
+        if self.variable_values:
+            payload["variables"] = self.variable_values
+        if self.persisted:
+            payload["extensions"] = {
+                "persistedQuery": {
+                    "version": 1,
+                    "sha256Hash": self.query.sha256,
+                }
+            }
+        return payload
+
+
+class PreparedQuery:
+    """
+    A GraphQL operation that is parsed, validated and printed once per process,
+    and reused for every request.
+    """
+    def __init__(self, name:str, text:str):
+        self.name = name
+        self.document = parse(text) # raises GraphQLError on bad syntax
+        self.text = strip_ignored_characters(text)
+        self.sha256 = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+
+    def request(self, variables:dict | None = None, mode:str = "compact", send_query:bool = True) -> PreparedRequest:
+        """
+        Build a request for this query. In "persisted" mode, the query text is only
+        sent if `send_query` is set, which is needed the first time a server sees it.
+        """
+        persisted = mode == "persisted"
+        return PreparedRequest(self, variables, persisted=persisted, send_query=send_query or not persisted)
+
+
+    def __str__(self):
+        return f"PreparedQuery({self.name} {self.sha256[:12]})"
+
+
+def is_persisted_query_miss(ex:Exception) -> bool:
+    """True if the server doesn't (yet) know a persisted query hash"""
+    return "PersistedQueryNotFound" in str(ex)
+
+
+def is_persisted_query_unsupported(ex:Exception) -> bool:
+    """True if the server doesn't support persisted queries at all"""
+    return "PersistedQueryNotSupported" in str(ex)
+
+
+UPDATE_PAGE = PreparedQuery("update", '''
+    mutation Page (
+            $id: Int!,
+            $content: String!,
+            $description: String!,
+            $editor:String!,
+            $isPublished:Boolean!,
+            $isPrivate:Boolean!,
+            $locale:String!,
+            $path:String!,
+            $tags:[String]!,
+            $title:String!) {
+        pages {
+            update (
+                id:$id,
+                content:$content,
+                description:$description,
+                editor: $editor,
+                isPublished: $isPublished,
+                isPrivate: $isPrivate,
+                locale: $locale,
+                path:$path,
+                tags: $tags,
+                title:$title
+            ) {
+                responseResult {
+                    succeeded
+                    errorCode
+                    slug
+                    message
+                }
+                page {
+                    id
+                    path
+                    title
+                }
+            }
+        }
+    }
+    ''')
+
+
+CREATE_PAGE = PreparedQuery("create", '''
+    mutation Page (
+            $content: String!,
+            $description: String!,
+            $editor:String!,
+            $isPublished:Boolean!,
+            $isPrivate:Boolean!,
+            $locale:String!,
+            $path:String!,
+            $tags:[String]!,
+            $title:String!) {
+        pages {
+            create (
+                content:$content,
+                description:$description,
+                editor: $editor,
+                isPublished: $isPublished,
+                isPrivate: $isPrivate,
+                locale: $locale,
+                path:$path,
+                tags: $tags,
+                title:$title
+            ) {
+                responseResult {
+                    succeeded
+                    errorCode
+                    slug
+                    message
+                }
+                page {
+                    id
+                    path
+                    title
+                }
+            }
+        }
+    }
+    ''')
+
+
+LIST_PAGES = PreparedQuery("list", '''
+    {
+        pages {
+            list (orderBy: PATH, limit:5000) {
+            id
+            path
+            title
+            description
+            }
+        }
+    }
+    ''')
+
+
+@functools.cache
+def delete_pages_query(count:int) -> PreparedQuery:
+    """A mutation deleting `count` pages in one request, with one aliased `delete` (d0, d1, ...) per page"""
+    params = ", ".join(f"$id{i}: Int!" for i in range(count))
+    fields = " ".join(f"d{i}: delete(id: $id{i}) {{ responseResult {{ succeeded errorCode slug message }} }}"
+                      for i in range(count))
+    return PreparedQuery(f"delete{count}", f"mutation DeletePages({params}) {{ pages {{ {fields} }} }}")
@@ -0,0 +1,115 @@
+import importlib
+import importlib.metadata
+import logging
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+from .page import Page
+
+log = logging.getLogger(__name__)
+
+
+# Third party converters register under this entry point group, named by the
+# file extension (".csv") or mime type ("text/csv") they handle, for example:
+#   [project.entry-points."wikinator.converters"]
+#   ".csv" = "mypackage.csvpages:load_file"
+ENTRY_POINT_GROUP = "wikinator.converters"
+
+
+MIMETYPE_MARKDOWN = "text/markdown"
+MIMETYPE_HTML = "text/html"
+MIMETYPE_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MIMETYPE_GDOC = "application/vnd.google-apps.document"
+MIMETYPE_FOLDER = "application/vnd.google-apps.folder"
+
+
+class ConverterRegistry:
+    """
+    Converters keyed by file extension (".docx") and mime type ("text/html").
+    Each converter is a "module:attribute" reference, only imported the first
+    time it's needed, so a run never pays for converters it doesn't use.
+    - for an extension, the attribute is called with the Path to load: `load_file(path) -> Page`
+    - for a mime type, the attribute is a DocumentConverter class (or instance), used for fetched documents
+    """
+    def __init__(self):
+        self.targets = {} # key -> "module:attr"
+        self.loaded = {} # key -> imported converter
+        self.lock = threading.Lock()
+        self.plugins_loaded = False
+
+
+    def register(self, target:str, extensions:list[str] = (), mimetypes:list[str] = ()):
+        for key in [ext.lower() for ext in extensions] + list(mimetypes):
+            self.targets[key] = target
+            self.loaded.pop(key, None)
+
+
+    def _load_plugins(self):
+        if self.plugins_loaded:
+            return
+        self.plugins_loaded = True
+        for entry in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+            log.debug(f"converter plugin {entry.name} = {entry.value}")
+            self.register(entry.value, extensions=[entry.name] if entry.name.startswith(".") else [],
+                          mimetypes=[] if entry.name.startswith(".") else [entry.name])
+
+
+    @staticmethod
+    def _resolve(target:str):
+        module_name, _, attrs = target.partition(":")
+        value = importlib.import_module(module_name)
+        for attr in attrs.split("."):
+            value = getattr(value, attr)
+        if isinstance(value, type):
+            value = value() # converter classes are used as a single instance
+        return value
+
+
+    def get(self, key:str):
+        """The converter for an extension or mime type, imported on first use, or None"""
+        key = key.lower() if key.startswith(".") else key
+        converter = self.loaded.get(key)
+        if converter is not None:
+            return converter
+        with self.lock:
+            self._load_plugins()
+            target = self.targets.get(key)
+            if target is None:
+                return None
+            converter = self.loaded.get(key)
+            if converter is None:
+                log.debug(f"loading converter {target} for {key}")
+                converter = self.loaded[key] = self._resolve(target)
+            return converter
+
+
+    def can_load(self, path:Path) -> bool:
+        """True if there's a converter for the file's extension, without importing it"""
+        if not self.plugins_loaded:
+            with self.lock:
+                self._load_plugins()
+        return path.suffix.lower() in self.targets
+
+
+    def load_file(self, path:Path) -> Page | Iterator[Page] | None:
+        """
+        Load `path` into a Page with the converter for its extension, or None if there isn't one.
+        Converters that split a file over several pages return an iterator of pages.
+        """
+        load = self.get(path.suffix)
+        if load is None:
+            log.debug(f"No converter for {path.suffix}, skipping {path}")
+            return None
+        return load(path)
+
+
+registry = ConverterRegistry()
+registry.register("wikinator.page:Page.load_file", extensions=[".md", ".markdown"])
+registry.register("wikinator.docxit:convert_file", extensions=[".docx"])
+registry.register("wikinator.csvtable:load_file", extensions=[".csv", ".tsv"])
+registry.register("wikinator.htmldoc:HtmlConverter", mimetypes=[MIMETYPE_HTML])
+registry.register("wikinator.htmldoc:PassthruConverter", mimetypes=[MIMETYPE_MARKDOWN])
+registry.register("wikinator.htmldoc:DocxConverter", mimetypes=[MIMETYPE_DOCX, MIMETYPE_GDOC])
+registry.register("wikinator.htmldoc:FolderConverter", mimetypes=[MIMETYPE_FOLDER])
+# PDF - extract text and ocr, render page images?
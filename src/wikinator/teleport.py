@@ -0,0 +1,177 @@
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from .docxit import convert_page
+from .gdrive import GoogleDrive
+from .page import Page
+from .pipeline import Pipeline
+from .registry import MIMETYPE_DOCX, MIMETYPE_GDOC
+from .wiki import GraphDB, GraphIngester
+
+log = logging.getLogger(__name__)
+
+
+# the Drive id in the description of a page exported by GoogleDrive.get_page
+SOURCE_ID = re.compile(r"generated from google docs id=(\S+)$")
+
+
+class Teleporter:
+    """
+    Mirror the Google Docs under a Drive folder into the wiki: the folder is
+    listed lazily, docs are exported as DOCX by `export_workers` threads,
+    converted in a pool of `processes` processes and uploaded by `upload_workers`
+    threads. The stages are joined by queues of at most `queue_size` pages, so
+    memory stays bounded however large the drive is. Nothing is written to disk,
+    but for a doc too large for files().export and bigger than the drive's
+    `spool_size`: it's streamed into a temp file, removed once converted.
+    With `changes`, only the docs changed since the last run are mirrored, and
+    the pages of docs removed from Drive, moved out of the folder, or renamed
+    are deleted.
+    """
+    def __init__(self, drive:GoogleDrive, db:GraphDB, export_workers:int = 8, processes:int | None = None,
+                 upload_workers:int = 4, queue_size:int = 16, changes:bool = False):
+        self.drive = drive
+        self.db = db
+        self.export_workers = export_workers
+        self.processes = processes or os.cpu_count() or 1
+        self.upload_workers = upload_workers
+        self.queue_size = queue_size
+        self.changes = changes
+        self.base = None # path of the folder holding the one being mirrored
+        self.pool = None
+        self.uploaded = 0
+        self.paths = {} # wiki path -> Drive id of the doc mirrored there, to catch collisions
+        self.failed = [] # Drive ids of the docs that didn't make it to the wiki
+        self.mirrored = {} # Drive id -> wiki path, of the docs uploaded
+        self.outside = [] # Drive ids of changed docs that aren't under the mirrored folder
+        self.lock = threading.Lock()
+
+
+    def export(self, item:dict, wikiroot:str) -> tuple[str, Page]:
+        """Export stage: the Drive id, and a page with the DOCX bytes at its wiki path"""
+        try:
+            page = self.drive.get_page(item, MIMETYPE_DOCX)
+        except Exception:
+            with self.lock:
+                self.failed.append(item["id"])
+            raise
+        # the path is set before converting, so image links are generated correctly
+        page.path = self.wiki_path(page.path or item["name"], wikiroot)
+        with self.lock:
+            other = self.paths.setdefault(page.path, item["id"])
+        if other != item["id"]:
+            log.warning(f"{item['name']} (id={item['id']}) and id={other} are both mirrored to {page.path}")
+        return item["id"], page
+
+
+    def wiki_path(self, path:str, wikiroot:str) -> str:
+        """The wiki path for a Drive path, relative to the folder holding the mirrored one"""
+        if self.base and path.startswith(self.base + "/"):
+            path = path[len(self.base) + 1:]
+        return GraphIngester.wiki_path(path, wikiroot)
+
+
+    def convert(self, item:tuple[str, Page]) -> tuple[str, Page]:
+        """
+        Convert stage: DOCX to markdown, in the process pool. A streamed export is
+        an open file, which can't be sent to another process: it's converted here,
+        straight from the file, rather than read into memory to be sent.
+        """
+        id, page = item
+        log.info(f"Converting {page.title}")
+        try:
+            if not isinstance(page.content, bytes):
+                return id, convert_page(page)
+            return id, self.pool.submit(convert_page, page).result()
+        except Exception:
+            with self.lock:
+                self.failed.append(id)
+            raise
+
+
+    def upload(self, item:tuple[str, Page]):
+        """Upload stage"""
+        id, page = item
+        result = self.db.update(page)
+        with self.lock:
+            if result:
+                self.uploaded += 1
+                self.mirrored[id] = page.path
+            else:
+                self.failed.append(id)
+
+
+    def _under(self, root_path:str, items:Iterable[dict]) -> Iterator[dict]:
+        """The items at or below root_path. The ids of the others are collected in `self.outside`."""
+        for item in items:
+            path = self.drive.folders.item_path(item)
+            if path and (path == root_path or path.startswith(root_path + "/")):
+                yield item
+            else:
+                self.outside.append(item["id"])
+
+
+    def delete_removed(self, ids:Iterable[str], wikiroot:str, mirrored:dict[str, str] | None = None) -> int:
+        """
+        Delete the wiki pages under `wikiroot` that were exported from the Drive files `ids`,
+        and the old pages of the docs in `mirrored` (Drive id -> wiki path) now at another path.
+        """
+        ids = set(ids)
+        mirrored = {id: path.strip("/") for id, path in (mirrored or {}).items()}
+        root = wikiroot.strip("/")
+        candidates = self.db.pages_under(root) if root else self.db.pageCache.values()
+        pages = []
+        for page in candidates:
+            match = SOURCE_ID.search(page.get("description") or "")
+            if not match:
+                continue
+            id = match.group(1)
+            if id in ids:
+                log.warning(f"deleting {page['path']} (id={page['id']}), removed from Drive or from the folder")
+                pages.append(page)
+            elif id in mirrored and page["path"].strip("/") != mirrored[id]:
+                log.warning(f"deleting {page['path']} (id={page['id']}), moved to {mirrored[id]}")
+                pages.append(page)
+        return self.db.delete_pages(pages) if pages else 0
+
+
+    def run(self, id:str, wikiroot:str) -> Pipeline:
+        """Mirror the folder (or single doc) `id`, or the whole drive for '/', under `wikiroot`"""
+        root = self.drive._get_node("root" if id == "/" else id)
+        parent = (root.get("parents") or [None])[0]
+        self.base = self.drive.get_parents(parent)
+
+        root_path = self.drive.folders.item_path(root)
+        if self.changes:
+            # a checkpoint per mirrored folder, so mirrors of different folders don't share one
+            items = self._under(root_path, self.drive.sync_items(MIMETYPE_GDOC, root["id"]))
+        else:
+            items = self.drive.known_files(root["id"])
+
+        pipeline = Pipeline(items, self.queue_size)
+        pipeline.add_stage("export", lambda item: self.export(item, wikiroot), self.export_workers)
+        # each convert thread waits on one conversion, keeping every process busy
+        pipeline.add_stage("convert", self.convert, self.processes)
+        pipeline.add_stage("upload", self.upload, self.upload_workers)
+        # spawned, not forked: the stage threads are already running
+        with ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn")) as self.pool:
+            pipeline.run()
+        self.pool = None
+
+        if self.changes:
+            # failed docs are retried by the next run
+            self.drive.finish_sync(self.failed, root["id"])
+            # only under the folder's own pages: other folders may be mirrored next to it
+            self.delete_removed(self.drive.removed + self.outside, self.wiki_path(root_path, wikiroot), self.mirrored)
+
+        pipeline.report()
+        stats = self.db.policy.stats
+        log.info(f"uploaded {self.uploaded} pages, requests={stats['calls']} retries={stats['retries']} failures={stats['failures']}")
+        if self.failed:
+            log.error(f"{len(self.failed)} docs failed: {', '.join(self.failed)}")
+        return pipeline
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import aiohttp
+import requests
+from gql.transport.exceptions import TransportConnectionFailed, TransportServerError
+
+log = logging.getLogger(__name__)
+
+
+# HTTP statuses that are worth another try: throttling, gateway trouble and timeouts
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """
+    Raised by a request function when the server answered with a status
+    that should be retried, optionally with the server's Retry-After hint.
+    """
+    def __init__(self, message:str, status:int | None = None, retry_after:float | None = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# connection trouble worth another try, whatever the request
+CONNECTION_ERRORS = (TransportConnectionFailed, TimeoutError, asyncio.TimeoutError,
+                     aiohttp.ClientConnectionError, requests.ConnectionError, requests.Timeout)
+# everything retry_delay may retry: what's left once the retries run out
+RETRYABLE_ERRORS = (RetryableError, TransportServerError) + CONNECTION_ERRORS
+
+
+def retry_after(value:str) -> float | None:
+    """Parse the seconds form of a Retry-After header"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `burst`.
+    `acquire` blocks until a token is available. Thread safe.
+    """
+    def __init__(self, rate:float, burst:int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def _refill(self, now:float):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+
+    def take(self, tokens:float = 1.0) -> float:
+        """Take `tokens` if the bucket has them, returning 0, or else the seconds until it will"""
+        if not self.rate or self.rate <= 0:
+            return 0.0 # unlimited
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+
+    def acquire(self, tokens:float = 1.0) -> float:
+        """Take `tokens` from the bucket, returning the number of seconds spent waiting"""
+        waited = 0.0
+        while wait := self.take(tokens):
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+
+class Backoff:
+    """Exponential backoff with full jitter: sleep is uniform in [0, min(cap, base * 2^attempt)]"""
+    def __init__(self, base:float = 0.5, cap:float = 30.0):
+        self.base = base
+        self.cap = cap
+
+
+    def delay(self, attempt:int) -> float:
+        return random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit: additive increase while the server answers
+    within `latency_target` seconds, multiplicative decrease on slow answers
+    or failures, at most once per congestion window: the requests already in
+    flight when the limit was decreased don't decrease it again.
+    `acquire` blocks while the limit is reached, and returns a ticket for `release`.
+    """
+    def __init__(self, initial:int = 4, minimum:int = 1, maximum:int = 16,
+                 latency_target:float = 2.0, decrease:float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.in_flight = 0
+        self.tickets = 0 # requests admitted so far
+        self.window = 0 # first ticket admitted after the last decrease
+        self.cond = threading.Condition()
+
+
+    def acquire(self) -> int:
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+            self.tickets += 1
+            return self.tickets - 1
+
+
+    def release(self, latency:float, ok:bool = True, ticket:int | None = None):
+        with self.cond:
+            self.in_flight -= 1
+            if not ok or latency > self.latency_target:
+                if ticket is None or ticket >= self.window:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.window = self.tickets
+                    log.debug(f"backing off concurrency to {int(self.limit)}, latency={latency:.2f}s ok={ok}")
+            else:
+                # roughly +1 per "window" of requests
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+
+class TransportPolicy:
+    """
+    Shared policy for wiki traffic (GraphQL and `/u` uploads):
+    - token bucket rate limit, `rate` requests per second
+    - up to `retries` retries with exponential backoff and jitter
+      on 429/5xx, timeouts and dropped connections
+    - AIMD concurrency limit that backs off when latency rises
+    """
+    def __init__(self, rate:float = 10.0, burst:int = 10, retries:int = 5,
+                 base_delay:float = 0.5, max_delay:float = 30.0,
+                 concurrency:int = 4, max_concurrency:int = 16, latency_target:float = 2.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.backoff = Backoff(base_delay, max_delay)
+        self.limiter = AIMDLimiter(concurrency, 1, max_concurrency, latency_target)
+        self.retries = retries
+        self.stats = {"calls": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+
+    def _count(self, name:str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+
+    def retry_delay(self, ex:Exception, attempt:int) -> float | None:
+        """
+        Return the number of seconds to wait before retrying after `ex`,
+        or None if `ex` isn't worth retrying.
+        """
+        if isinstance(ex, RetryableError):
+            if ex.retry_after is not None:
+                return min(ex.retry_after, self.backoff.cap)
+        elif isinstance(ex, TransportServerError):
+            if ex.code not in RETRY_STATUS:
+                return None
+        elif not isinstance(ex, CONNECTION_ERRORS):
+            return None
+        return self.backoff.delay(attempt)
+
+
+    def admit(self, kind:str | None = None, cost:float = 1.0):
+        """Wait until the rate limit allows a call of `kind`, costing `cost` tokens"""
+        self.bucket.acquire(cost)
+
+
+    def call(self, func, *args, **kwargs):
+        """Call `func(*args, **kwargs)` under the policy, retrying as needed"""
+        return self.call_as(None, 1.0, func, *args, **kwargs)
+
+
+    def call_as(self, kind:str, cost:float, func, *args, **kwargs):
+        """Call `func(*args, **kwargs)` as a call of `kind`, costing `cost` tokens, retrying as needed"""
+        attempt = 0
+        while True:
+            self.admit(kind, cost)
+            ticket = self.limiter.acquire()
+            self._count("calls")
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as ex:
+                delay = self.retry_delay(ex, attempt)
+                # only transport trouble counts against concurrency, not query errors
+                self.limiter.release(time.monotonic() - start, ok=delay is None, ticket=ticket)
+                if delay is None or attempt >= self.retries:
+                    self._count("failures")
+                    raise
+                attempt += 1
+                self._count("retries")
+                log.warning(f"{type(ex).__name__}: {ex}, retry {attempt}/{self.retries} in {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                self.limiter.release(time.monotonic() - start, ok=True, ticket=ticket)
+                return result
@@ -0,0 +1,114 @@
+import gzip
+import logging
+import threading
+import zlib
+
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportServerError
+
+log = logging.getLogger(__name__)
+
+
+ENCODINGS = {
+    "gzip": gzip.compress,
+    "deflate": zlib.compress, # HTTP "deflate" is the zlib format
+}
+
+# statuses a server answers with when it can't read a compressed body
+REFUSED_STATUS = {400, 415}
+
+
+class Compression:
+    """
+    Request body compression for GraphQL requests: settings, the negotiated
+    state for the server, and stats on bytes saved. Shared by every transport
+    (one per thread) talking to the same server.
+    """
+    def __init__(self, encoding:str = "gzip", threshold:int = 16 * 1024, level:int = 6):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding: {encoding}, expected one of {list(ENCODINGS)}")
+        self.encoding = encoding
+        self.threshold = threshold
+        self.level = level
+        self.supported = True # until the server refuses a compressed body
+        self.stats = {"requests": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0}
+        self.lock = threading.Lock()
+
+
+    def encode(self, body:bytes) -> tuple[bytes, str | None]:
+        """Compress `body` if worthwhile, returning the body to send and its encoding (or None)"""
+        encoding = None
+        data = body
+        if self.supported and len(body) >= self.threshold:
+            compressed = ENCODINGS[self.encoding](body, self.level)
+            if len(compressed) < len(body):
+                data = compressed
+                encoding = self.encoding
+
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_in"] += len(body)
+            self.stats["bytes_out"] += len(data)
+            if encoding:
+                self.stats["compressed"] += 1
+        return data, encoding
+
+
+    def refused(self, status:int):
+        if self.supported:
+            log.warning(f"Server refused {self.encoding} request body (status={status}), sending uncompressed")
+        self.supported = False
+
+
+    @property
+    def saved(self) -> int:
+        return self.stats["bytes_in"] - self.stats["bytes_out"]
+
+
+    def __str__(self):
+        stats = self.stats
+        return (f"{self.encoding}: {stats['compressed']}/{stats['requests']} requests compressed, "
+                f"{stats['bytes_in']} -> {stats['bytes_out']} bytes, saved {self.saved}")
+
+
+class WikiTransport(AIOHTTPTransport):
+    """
+    AIOHTTPTransport that can send JSON request bodies compressed with
+    `Content-Encoding`, falling back to plain bodies if the server refuses them.
+    """
+    def __init__(self, *args, compression:Compression = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compression = compression
+        self.compressed = False # was the last request body compressed?
+        self.plain = False # send the next request uncompressed
+
+
+    def _prepare_request(self, request, extra_args:dict | None = None, upload_files:bool = False) -> dict:
+        post_args = super()._prepare_request(request, extra_args, upload_files)
+        self.compressed = False
+        if self.compression and not self.plain and "json" in post_args:
+            body = self.json_serialize(post_args.pop("json")).encode("utf-8")
+            data, encoding = self.compression.encode(body)
+            headers = {"Content-Type": "application/json"}
+            if encoding:
+                headers["Content-Encoding"] = encoding
+                self.compressed = True
+            post_args["data"] = data
+            post_args["headers"] = {**post_args.get("headers", {}), **headers}
+        return post_args
+
+
+    async def execute(self, request, **kwargs):
+        try:
+            return await super().execute(request, **kwargs)
+        except TransportServerError as ex:
+            if not (self.compressed and ex.code in REFUSED_STATUS):
+                raise
+            # try again uncompressed: if that works, the server can't take compressed bodies
+            self.plain = True
+            try:
+                result = await super().execute(request, **kwargs)
+            finally:
+                self.plain = False
+            self.compression.refused(ex.code)
+            return result
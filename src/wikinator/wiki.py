@@ -1,28 +1,61 @@
 import io
 import logging
+import os
+import re
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from gql import Client, gql
-from gql.transport.aiohttp import AIOHTTPTransport
-from gql.transport.exceptions import TransportQueryError
 import requests
-
+from gql import Client
+from gql.transport.exceptions import TransportError, TransportQueryError
 
 from wikinator.config import AppConfig
 
-from .page import Page
+from .archive import PageArchive
 from .converter import Converter
-from .docxit import DocxitConverter
-
+from .journal import UploadJournal, content_hash
+from .page import Page
+from .pathmatch import PathMatcher
+from .pipeline import fan_out
+from .queries import (
+    CREATE_PAGE,
+    LIST_PAGES,
+    UPDATE_PAGE,
+    PreparedQuery,
+    delete_pages_query,
+    is_persisted_query_miss,
+    is_persisted_query_unsupported,
+)
+from .registry import registry
+from .throttle import (
+    RETRY_STATUS,
+    RETRYABLE_ERRORS,
+    RetryableError,
+    TransportPolicy,
+    retry_after,
+)
+from .transport import Compression, WikiTransport
+from .writer import PageWriter
 
 log = logging.getLogger(__name__)
 
 
+UPLOAD_TIMEOUT = 60 # seconds
+PART_PATH = re.compile(r"_part\d+$") # suffix of Page.part_path
+
+
 class GraphDB:
-    def __init__(self, url:str, token:str):
+    def __init__(self, url:str, token:str, policy:TransportPolicy = None, query_mode:str = "compact",
+                 compression:Compression = None):
         self.url = url
         self.token = token # FIXME: REMOVE - this is only used for testing file upload using other tools
-        self.client = self._init_client(url, token)
+        self.policy = policy or TransportPolicy()
+        self.failures = [] # paths that failed after all retries
+        self.query_mode = query_mode
+        self.compression = compression
+        self._local = threading.local()
         self.pageCache = self.all_pages()
 
 
@@ -39,10 +72,47 @@ class GraphDB:
         - GRAPH_DB : The full URL for requests to the graph DB
         - AUTH_TOKEN : Security token to authorize session
         """
-        transport = AIOHTTPTransport(url=url + '/graphql', headers={'Authorization': f'Bearer {token}'}, ssl=True)
+        transport = WikiTransport(url=url + '/graphql', headers={'Authorization': f'Bearer {token}'}, ssl=True,
+                                  compression=self.compression)
         return Client(transport=transport)
 
 
+    @property
+    def client(self) -> Client:
+        """GraphQL client for the current thread, as a transport can't be shared across threads"""
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._init_client(self.url, self.token)
+        return client
+
+
+    def _execute(self, query:PreparedQuery, variables:dict | None = None):
+        """Execute a prepared query under the transport policy (rate limit, retry, backoff)"""
+        if self.query_mode == "persisted":
+            request = query.request(variables, self.query_mode, send_query=False)
+            result = self.policy.call(self._execute_persisted, request)
+            if not isinstance(result, TransportQueryError):
+                return result
+            if is_persisted_query_unsupported(result):
+                log.info("Persisted queries not supported by server, sending compact queries")
+                self.query_mode = "compact"
+            # first use of the query: send the text with the hash, so the server registers it
+        return self.policy.call(self.client.execute, query.request(variables, self.query_mode))
+
+
+    def _execute_persisted(self, request):
+        """
+        Send a query by its hash alone. The server not knowing the hash is an
+        expected answer, returned rather than raised, so it isn't a policy failure.
+        """
+        try:
+            return self.client.execute(request)
+        except TransportQueryError as ex:
+            if is_persisted_query_miss(ex) or is_persisted_query_unsupported(ex):
+                return ex
+            raise
+
+
     def id_for_path(self, path:str) -> int:
         cached = self.pageCache.get(path)
         if cached:
@@ -74,13 +144,54 @@ class GraphDB:
         #     return 0
 
 
-    def delete(self, page:Page) -> Page:
+    def delete(self, page:Page) -> bool:
         id = self.id_for_path(page.path)
         if id > 0:
-            log.info("TODO deleting page", page)
+            return self.delete_pages([self.pageCache[page.path]]) == 1
+        return False
+
+
+    def _delete_batch(self, batch:list[dict]) -> int:
+        query = delete_pages_query(len(batch))
+        variables = {f"id{i}": page["id"] for i, page in enumerate(batch)}
+        try:
+            response = self._execute(query, variables)
+        except (TransportError, *RETRYABLE_ERRORS) as ex:
+            log.error(f"Error deleting {len(batch)} pages: {ex}")
+            self.failures.extend(page["path"] for page in batch)
+            return 0
+
+        deleted = 0
+        for i, page in enumerate(batch):
+            result = response["pages"][f"d{i}"]["responseResult"]
+            if result["succeeded"]:
+                log.info(f"deleted {page['path']}")
+                self.pageCache.pop(page["path"], None)
+                deleted += 1
+            else:
+                log.error(f"Delete of {page['path']} failed: {result['message']}")
+                self.failures.append(page["path"])
+        return deleted
+
 
+    def delete_pages(self, pages:list[dict], batch_size:int = 25, workers:int = 4) -> int:
+        """
+        Delete cached `pages` (as found in pageCache: id, path), `batch_size` deletes
+        per request, with up to `workers` requests in flight. Returns the number deleted.
+        """
+        batches = [pages[i:i + batch_size] for i in range(0, len(pages), batch_size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return sum(pool.map(self._delete_batch, batches))
+
+
+    def pages_under(self, root:str) -> list[dict]:
+        """Cached pages at or below the wiki path `root`"""
+        root = root.strip("/")
+        return [page for path, page in self.pageCache.items()
+                if path.strip("/") == root or path.strip("/").startswith(root + "/")]
 
-    def update(self, page:Page) -> Page:
+
+    def update(self, page:Page) -> Page | None:
         if page.tags is None:
             page.tags = ["gdocs"]
 
@@ -89,55 +200,25 @@ class GraphDB:
         if id > 0:
             log.info(f"updating page {page.path}")
             page.id = id
-            query = gql('''
-                mutation Page (
-                        $id: Int!,
-                        $content: String!,
-                        $description: String!,
-                        $editor:String!,
-                        $isPublished:Boolean!,
-                        $isPrivate:Boolean!,
-                        $locale:String!,
-                        $path:String!,
-                        $tags:[String]!,
-                        $title:String!) {
-                    pages {
-                        update (
-                            id:$id,
-                            content:$content,
-                            description:$description,
-                            editor: $editor,
-                            isPublished: $isPublished,
-                            isPrivate: $isPrivate,
-                            locale: $locale,
-                            path:$path,
-                            tags: $tags,
-                            title:$title
-                        ) {
-                            responseResult {
-                                succeeded
-                                errorCode
-                                slug
-                                message
-                            }
-                            page {
-                                id
-                                path
-                                title
-                            }
-                        }
-                    }
-                }
-                ''')
             try:
-                # images:
-                if page.images:
-                    for rId in page.images:
-                        self.upload_image(page, rId)
-
-                return self.client.execute(query, variable_values=page.vars())
+                # images first, so the page doesn't link to missing ones
+                if not self.upload_images(page):
+                    return None
+
+                response = self._execute(UPDATE_PAGE, page.vars())
+                result = response["pages"]["update"]["responseResult"]
+                if not result["succeeded"]:
+                    log.error(f"Update of {page.path} failed: {result['message']}")
+                    self.failures.append(page.path)
+                    return None
+                updated = response["pages"]["update"]["page"]
+                return Page.load(updated) if updated else page
             except TransportQueryError as e:
                 log.error(f"update failed on {page.path}: {e}")
+                self.failures.append(page.path)
+            except (TransportError, *RETRYABLE_ERRORS) as e:
+                log.error(f"update failed on {page.path} after {self.policy.retries} retries: {e}")
+                self.failures.append(page.path)
         else:
             # page doesn't exist! create!
             log.info(f"page doesn't exist, creating: {page.path}")
@@ -148,71 +229,30 @@ class GraphDB:
         if page.tags is None:
             page.tags = ["gdocs"]
 
-        query = gql(
-            '''
-            mutation Page (
-                    $content: String!,
-                    $description: String!,
-                    $editor:String!,
-                    $isPublished:Boolean!,
-                    $isPrivate:Boolean!,
-                    $locale:String!,
-                    $path:String!,
-                    $tags:[String]!,
-                    $title:String!) {
-                pages {
-                    create (
-                        content:$content,
-                        description:$description,
-                        editor: $editor,
-                        isPublished: $isPublished,
-                        isPrivate: $isPrivate,
-                        locale: $locale,
-                        path:$path,
-                        tags: $tags,
-                        title:$title
-                    ) {
-                        responseResult {
-                            succeeded
-                            errorCode
-                            slug
-                            message
-                        }
-                        page {
-                            id
-                            path
-                            title
-                        }
-                    }
-                }
-            }
-            '''
-        )
         try:
-            # images:
-            log.warning("Uploading images")
-            if page.images:
-                for rId in page.images:
-                    log.warning(f"Uploading image {rId}")
-                    self.upload_image(page, rId)
+            # images first, so the page doesn't link to missing ones
+            if not self.upload_images(page):
+                return None
 
-            log.warning(f"creating: {query}")
-            response = self.client.execute(query, variable_values=page.vars())
+            log.debug(f"creating: {CREATE_PAGE}")
+            response = self._execute(CREATE_PAGE, page.vars())
 
-            log.warning(f"CREATE: {response}")
+            log.debug(f"CREATE: {response}")
 
             result = response["pages"]["create"]["responseResult"]
             if not result["succeeded"]:
-                log.error(f"Creation of {page.path} failed: {result["message"]}")
+                log.error(f"Creation of {page.path} failed: {result['message']}")
+                self.failures.append(page.path)
                 return None
 
-            log.info(f"#### {response["pages"]["create"]["page"]}")
+            log.debug(f"#### {response['pages']['create']['page']}")
             result_page = Page.load(response["pages"]["create"]["page"])
-
+            self.pageCache[result_page.path] = response["pages"]["create"]["page"]
 
             return result_page
         except Exception as ex:
             log.error(f"Error creating {page.path}: {ex}")
+            self.failures.append(page.path)
             return None
 
         # {"data":{"pages":{"create":{
@@ -280,50 +320,58 @@ class GraphDB:
     #             return {}
 
 
-    def upload_image(self, page:Page, rId:str) -> str:
+    def _post_image(self, url:str, path:str, image) -> requests.Response:
+        # a fresh buffer for each attempt, as a retry needs to re-read the content
+        with io.BytesIO(image.content) as image_data:
+            headers = {
+                'Authorization': f'Bearer {self.token}'
+            }
+
+            files = (
+                ('mediaUpload', (None, '{"folderId":0}')),  # Using root asset folder
+                ('mediaUpload', (path, image_data, image.mimetype))
+            )
+
+            log.debug(f"Sending upload request: {url} POST {image.name}/{image.mimetype} -> {path}")
+            result = requests.post(url, headers=headers, files=files, timeout=UPLOAD_TIMEOUT)
+            if result.status_code in RETRY_STATUS:
+                raise RetryableError(f"upload {path}: status={result.status_code}", result.status_code,
+                                     retry_after(result.headers.get("Retry-After")))
+            return result
+
+
+    def upload_image(self, page:Page, rId:str) -> bool:
         image = page.get_image(rId)
         path = page.get_image_path(rId) # this scopes the path with the page name and path
         url = self.url + "/u"
 
         try:
-            with io.BytesIO(image.content) as image_data:
-                headers = {
-                    'Authorization': f'Bearer {self.token}'
-                }
-
-                files = (
-                    ('mediaUpload', (None, '{"folderId":0}')),  # Using root asset folder
-                    ('mediaUpload', (path, image_data, image.mimetype))
-                )
-
-                log.debug(f"Sending upload request: {url} POST {image.name}/{image.mimetype} -> {path}")
-                result = requests.post(url, headers=headers, files=files)
-                if result.ok:
-                    log.info(f"Upload OK: status={result.status_code} path={path}")
-                else:
-                    log.warning(f"Image upload failed: {page.title} {image.name}")
-        except Exception:
-            log.exception(f"Error uploading ${path}")
+            result = self.policy.call(self._post_image, url, path, image)
+        except (requests.RequestException, *RETRYABLE_ERRORS) as ex:
+            log.error(f"Error uploading {path}: {ex}")
+            return False
+        if not result.ok:
+            log.error(f"Image upload failed: {page.title} {image.name}, status={result.status_code}")
+            return False
+        log.info(f"Upload OK: status={result.status_code} path={path}")
+        return True
+
+
+    def upload_images(self, page:Page) -> bool:
+        """Upload the images of `page`. If any fails, the page is recorded as failed and False returned."""
+        failed = [rId for rId in page.images or () if not self.upload_image(page, rId)]
+        if failed:
+            log.error(f"{len(failed)} images of {page.path} failed to upload, not uploading the page")
+            self.failures.append(page.path)
+            return False
+        return True
 
 
     def all_pages(self):
         pages = {}
 
         # returns a map indexed by path
-        query = gql(
-            '''
-            {
-                pages {
-                    list (orderBy: PATH, limit:5000) {
-                    id
-                    path
-                    title
-                    }
-                }
-            }
-            '''
-        )
-        result = self.client.execute(query)
+        result = self._execute(LIST_PAGES)
 
         for page in result["pages"]["list"]:
             pages[page["path"]] = page
@@ -334,34 +382,213 @@ class GraphDB:
 
 
 class GraphIngester(Converter):
-    def __init__(self, url:str, token:str, output:bool = False):
-        self.db = GraphDB(url, token)
+    def __init__(self, url:str, token:str, output:bool = False, policy:TransportPolicy = None,
+                 query_mode:str = "compact", compression:Compression = None, journal:UploadJournal = None,
+                 prune:bool = False, dry_run:bool = False, workers:int = 4, matcher:PathMatcher = None,
+                 archive:PageArchive = None):
+        self.db = GraphDB(url, token, policy, query_mode, compression)
+        self.matcher = matcher
+        self.store_workers = workers # concurrent uploads
         self.output = output
-
-    # use the "file walk" from the converter to upload
-    def convert_file(self, full_path:Path, outroot:str):
+        self.writer = None # PageWriter for local copies, while converting
+        self.archive = archive
+        self.journal = journal
+        self.prune = prune
+        self.dry_run = dry_run
+        self.skipped = 0
+        self.seen = set() # wiki paths of every source file found
+        self.kept = set() # wiki paths of source files skipped or failed: none of their pages are pruned
+        self.kept_dirs = set() # wiki paths of excluded directories: no page under them is pruned
+        self.lock = threading.Lock()
+
+
+    @staticmethod
+    def wiki_path(path:str, outroot:str) -> str:
         # FIXME: file/path naming should be abstracted somehow.
-        if outroot.strip() in ["/", ""]:
-            outroot = ""
-            wikipath = f"{full_path.parent}/{full_path.stem}"
-        else:
-            wikipath = f"{outroot}/{full_path.parent}/{full_path.stem}"
+        if outroot.strip() not in ["/", ""]:
+            path = f"{outroot}/{path}"
 
         # replace chars in path
-        log.info(f"BEFORE {wikipath}")
+        path = path.replace(" ", "_")
+        path = path.replace(".", "_")
+        return path
 
-        wikipath = wikipath.replace(" ", "_")
-        wikipath = wikipath.replace(".", "_")
-        log.info(f"Converting {full_path} into {wikipath}")
 
-        page = DocxitConverter.load_file(full_path)
-        if page:
-            # make sure the path is correct
-            page.path = wikipath
+    def prune_orphans(self, inpath:str, outroot:str) -> list[dict]:
+        """
+        Delete wiki pages under the uploaded tree that no longer have a source file.
+        The orphans are reported first; with dry_run, nothing is deleted.
+        """
+        root = self.wiki_path(str(Path(inpath)), outroot)
+        if not root.strip("/"):
+            log.error("Refusing to prune the whole wiki")
+            return []
+
+        # every part of a converted split file is in seen: parts it no longer has are orphans too
+        seen = {path.strip("/") for path in self.seen}
+        orphans = [page for page in self.db.pages_under(root)
+                   if page["path"].strip("/") not in seen and not self._kept(page["path"])]
+        log.warning(f"{len(orphans)} pages under {root} have no source file:")
+        for page in orphans:
+            log.warning(f"  {page['path']} (id={page['id']})")
+
+        if orphans and not self.dry_run:
+            deleted = self.db.delete_pages(orphans)
+            log.warning(f"deleted {deleted} of {len(orphans)} pages")
+        return orphans
+
+
+    def _keep(self, wikipath:str):
+        """Leave every page of the source file at `wikipath` out of pruning"""
+        with self.lock:
+            self.kept.add(wikipath)
+
+
+    def _kept(self, path:str) -> bool:
+        """True if the page at `path` belongs to a source file left as it is, or to an excluded directory"""
+        path = path.strip("/")
+        kept = {kept.strip("/") for kept in self.kept}
+        if path in kept or PART_PATH.sub("", path) in kept:
+            return True
+        dirs = {kept.strip("/") for kept in self.kept_dirs}
+        parts = path.split("/")
+        return any("/".join(parts[:n]) in dirs for n in range(1, len(parts)))
+
+
+    def excluded(self, path:Path, is_dir:bool, outroot:str):
+        """Excluded files and directories keep their pages: they aren't orphans"""
+        if is_dir:
+            with self.lock:
+                self.kept_dirs.add(self.wiki_path(str(path), outroot))
+        elif registry.can_load(path):
+            self._keep(self.wiki_path(f"{path.parent}/{path.stem}", outroot))
+
+
+    def convert_directory(self, inpath:str, outroot:str):
+        if self.output:
+            self.writer = PageWriter("" if outroot.strip() in ["/", ""] else outroot)
+        try:
+            pipeline = super().convert_directory(inpath, outroot)
+        finally:
+            if self.journal:
+                self.journal.close()
+            if self.writer:
+                self.writer.close()
+                self.writer = None
+            if self.archive:
+                self.archive.close()
+        if self.prune and os.path.isdir(inpath):
+            self.prune_orphans(inpath, outroot)
+        if self.skipped:
+            log.info(f"skipped {self.skipped} files already uploaded")
+        stats = self.db.policy.stats
+        log.info(f"requests={stats['calls']} retries={stats['retries']} failures={stats['failures']}")
+        if self.db.compression:
+            log.info(f"compression {self.db.compression}")
+        if self.db.failures:
+            log.error(f"{len(self.db.failures)} pages failed to upload: {', '.join(self.db.failures)}")
+        return pipeline
+
+    def load(self, full_path:Path, outroot:str):
+        """
+        Convert stage: returns (page, FileParts) for each page of the file,
+        or None if there's nothing to upload
+        """
+        wikipath = self.wiki_path(f"{full_path.parent}/{full_path.stem}", outroot)
+        if not registry.can_load(full_path):
+            log.debug(f"Skipping {full_path}")
+            return None
+        self.seen.add(wikipath)
+
+        hash = None
+        upload = True
+        if self.journal:
+            hash = content_hash(full_path)
+            if self.journal.is_done(full_path, hash):
+                with self.lock:
+                    self.skipped += 1
+                # maybe not converted, so its parts aren't known: keep all of them
+                self._keep(wikipath)
+                if not (self.archive or self.output):
+                    log.debug(f"Already uploaded, skipping {full_path}")
+                    return None
+                # still converted, so the local copies have every page
+                log.debug(f"Already uploaded, only writing {full_path}")
+                upload = False
 
-            self.db.update(page)
+        log.info(f"Converting {full_path} into {wikipath}")
 
-            if self.output:
-                page.write(outroot)
-        else:
+        try:
+            pages = registry.load_file(full_path)
+        except Exception:
+            self._keep(wikipath)
+            raise
+        if not pages:
             log.debug(f"Skipping {full_path}")
+            return None
+        return self._items(full_path, hash, wikipath, fan_out(pages), upload)
+
+
+    def _items(self, full_path:Path, hash:str, wikipath:str, pages:Iterable[Page], upload:bool = True) -> Iterator[tuple]:
+        """Upload items for the pages of a file, at wikipath and its part paths, sharing one FileParts"""
+        parts = FileParts(full_path, hash, wikipath, upload)
+        previous = None
+        try:
+            for n, page in enumerate(pages, start=1):
+                # make sure the path is correct
+                page.path = wikipath if n == 1 else Page.part_path(wikipath, n)
+                self.seen.add(page.path)
+                with self.lock:
+                    parts.left += 1
+                if previous:
+                    yield previous
+                previous = (page, parts)
+        except Exception:
+            # the parts after the error weren't seen: keep them all
+            self._keep(wikipath)
+            raise
+        if previous:
+            with self.lock:
+                parts.listed = True # before the last part is handed on, so its upload can finish the file
+            yield previous
+
+
+    def store(self, item:tuple, outroot:str):
+        """Upload stage: update the wiki, record the file once all its parts are up, and write the page if needed"""
+        page, parts = item
+        if parts.upload:
+            result = self.db.update(page)
+            with self.lock:
+                parts.left -= 1
+                if not result:
+                    parts.failed = True
+                    self.kept.add(parts.wikipath) # nothing of a file that failed is pruned
+                elif page.path == parts.wikipath:
+                    parts.page_id = result.id
+                finished = parts.listed and parts.left == 0 and not parts.failed
+            if finished and self.journal:
+                self.journal.record(parts.full_path, parts.page_id, parts.hash)
+
+        if self.archive:
+            self.archive.add(page)
+        if self.writer:
+            self.writer.write(page)
+        elif self.output:
+            page.write("" if outroot.strip() in ["/", ""] else outroot)
+
+
+class FileParts:
+    """
+    The upload state of a source file, shared by its pages: one for most files,
+    or every part of a split one. They're uploaded by different store workers,
+    and the file is only journaled once all of them have succeeded.
+    """
+    def __init__(self, full_path:Path, hash:str, wikipath:str, upload:bool = True):
+        self.full_path = full_path
+        self.hash = hash
+        self.wikipath = wikipath
+        self.upload = upload # False for a file already uploaded, only written locally
+        self.page_id = None
+        self.left = 0 # parts listed, not uploaded yet
+        self.listed = False # all the parts have been listed
+        self.failed = False
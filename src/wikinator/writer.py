@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+_created_dirs = set() # directories known to exist, to skip repeated mkdir calls
+_dirs_lock = threading.Lock()
+
+
+def make_dirs(directory:Path):
+    """Create `directory` (and parents) once per process"""
+    if directory in _created_dirs:
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    with _dirs_lock:
+        _created_dirs.add(directory)
+
+
+def file_hash(filename:Path) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_identical(filename:Path, data:bytes) -> bool:
+    """True if `filename` already holds `data`: sizes are compared first, then hashes"""
+    try:
+        if os.stat(filename).st_size != len(data):
+            return False
+        return file_hash(filename) == hashlib.sha256(data).hexdigest()
+    except FileNotFoundError:
+        return False
+
+
+def write_if_changed(filename:Path, content:str | bytes) -> bool:
+    """
+    Write `content` to `filename`, unless the file is already identical.
+    The data goes to a temp file in the same directory which is then renamed
+    over the target, so an interrupted write never leaves a partial file.
+    Returns True if the file was written.
+    """
+    filename = Path(filename)
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    make_dirs(filename.parent)
+    if is_identical(filename, data):
+        log.debug(f"unchanged {filename}")
+        return False
+
+    temp = filename.with_name(f".{filename.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, filename)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    return True
+
+
+class PageWriter:
+    """
+    Writes pages under `root` on a small thread pool, so converting and uploading
+    don't wait on the disk. At most `max_pending` writes are queued: past that,
+    `write` blocks until one finishes. `flush` waits for all queued writes.
+    """
+    def __init__(self, root:str = "", workers:int = 4, max_pending:int = 64):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="writer")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.stats = {"written": 0, "unchanged": 0, "failed": 0}
+
+
+    def _done(self, future:Future):
+        self.slots.release()
+        with self.lock:
+            self.pending.discard(future)
+            if future.exception():
+                log.error(f"write failed: {future.exception()}")
+                self.stats["failed"] += 1
+            elif future.result():
+                self.stats["written"] += 1
+            else:
+                self.stats["unchanged"] += 1
+
+
+    def write_file(self, filename:Path, content:str | bytes) -> Future:
+        self.slots.acquire()
+        future = self.pool.submit(write_if_changed, filename, content)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+
+    def write(self, page) -> Future:
+        """Queue the page's markdown for writing, at the page path under root"""
+        filename = page.filename(self.root)
+        log.info(f"writing {filename}")
+        return self.write_file(filename, page.content)
+
+
+    def flush(self):
+        with self.lock:
+            pending = list(self.pending)
+        wait(pending) # failures are counted and logged in _done
+
+
+    def close(self):
+        self.flush()
+        self.pool.shutdown()
+        log.info(f"local copies: {self.stats['written']} written, {self.stats['unchanged']} unchanged, "
+                 f"{self.stats['failed']} failed")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
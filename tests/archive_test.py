@@ -0,0 +1,60 @@
+# Tests for writing converted pages into a single archive
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from wikinator.archive import PageArchive
+from wikinator.page import Page, PageImage
+
+
+def make_pages() -> list[Page]:
+    pages = []
+    for i in range(3):
+        page = Page.load({"content": f"# page {i}\n", "path": f"docs/page{i}", "title": f"Page {i}", "description": ""})
+        page.add_image("rId7", PageImage("image1.png", b"\x89PNG" + bytes([i])))
+        pages.append(page)
+    return pages
+
+
+def check_manifest(manifest:bytes, names:list[str]):
+    entries = [json.loads(line) for line in manifest.decode().splitlines()]
+    assert [entry["file"] for entry in entries] == ["docs/page0.md", "docs/page1.md", "docs/page2.md"]
+    assert entries[1]["images"] == ["docs-page1-image1.png"]
+    assert all(entry["file"] in names for entry in entries)
+
+
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tar.zst"])
+def test_tar(tmp_path, suffix):
+    filename = tmp_path / f"out{suffix}"
+    try:
+        archive = PageArchive(filename)
+    except tarfile.CompressionError:
+        pytest.skip(f"{suffix} not supported by this python")
+    with archive:
+        for page in make_pages():
+            archive.add(page)
+
+    with tarfile.open(filename) as tar:
+        names = tar.getnames()
+        assert names[-1] == "manifest.jsonl"
+        assert tar.extractfile("docs/page1.md").read() == b"# page 1\n"
+        check_manifest(tar.extractfile("manifest.jsonl").read(), names)
+
+
+def test_zip(tmp_path):
+    filename = tmp_path / "out.zip"
+    with PageArchive(filename) as archive:
+        for page in make_pages():
+            archive.add(page)
+
+    with zipfile.ZipFile(filename) as zip:
+        assert zip.read("docs/page2.md") == b"# page 2\n"
+        assert zip.read("docs-page2-image1.png") == b"\x89PNG\x02"
+        check_manifest(zip.read("manifest.jsonl"), zip.namelist())
+
+
+def test_unknown_type(tmp_path):
+    with pytest.raises(ValueError):
+        PageArchive(tmp_path / "out.rar")
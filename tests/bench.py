@@ -0,0 +1,102 @@
+"""
+Upload benchmark against the in-process stand-in wiki.
+
+    python -m tests.bench --pages 200 --images 2 --latency 0.05 --workers 1,4,8
+
+Reports pages/s and images/s for each concurrency setting, with no network needed.
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.standin import StandinWiki
+from wikinator.page import Page, PageImage
+from wikinator.throttle import TransportPolicy
+from wikinator.transport import Compression
+from wikinator.wiki import GraphDB
+
+log = logging.getLogger(__name__)
+
+
+def make_pages(count:int, images:int, size:int, image_size:int) -> list[Page]:
+    """Generate synthetic pages, each with `size` bytes of markdown and `images` images"""
+    pages = []
+    for i in range(count):
+        page = Page.load({
+            "content": f"# Page {i}\n\n" + ("lorem ipsum " * (size // 12)),
+            "path": f"bench/page-{i}",
+            "title": f"Page {i}",
+            "description": "benchmark page",
+        })
+        for j in range(images):
+            page.add_image(f"rId{j}", PageImage(f"image{j}.png", os.urandom(image_size)))
+        pages.append(page)
+    return pages
+
+
+def run(wiki:StandinWiki, pages:list[Page], workers:int, rate:float = 0, query_mode:str = "compact",
+        compress:str | None = None) -> dict:
+    """Upload `pages` to `wiki` with `workers` threads, returning throughput stats"""
+    policy = TransportPolicy(rate=rate, concurrency=workers, max_concurrency=workers, base_delay=0.05)
+    compression = Compression(compress) if compress else None
+    db = GraphDB(wiki.url, "bench-token", policy, query_mode, compression)
+    images = sum(len(page.images) for page in pages)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(db.update, pages))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "workers": workers,
+        "pages": len(pages),
+        "images": images,
+        "seconds": elapsed,
+        "pages/s": len(pages) / elapsed,
+        "images/s": images / elapsed,
+        "retries": policy.stats["retries"],
+        "failures": len(db.failures),
+    }
+
+
+def report(results:list[dict]):
+    columns = ["workers", "pages", "images", "seconds", "pages/s", "images/s", "retries", "failures"]
+    print("  ".join(f"{c:>9}" for c in columns))
+    for result in results:
+        print("  ".join(f"{result[c]:>9.2f}" if isinstance(result[c], float) else f"{result[c]:>9}"
+                        for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark wiki uploads against a local stand-in server")
+    parser.add_argument("--pages", type=int, default=100, help="pages per run")
+    parser.add_argument("--images", type=int, default=1, help="images per page")
+    parser.add_argument("--size", type=int, default=20_000, help="bytes of markdown per page")
+    parser.add_argument("--image-size", type=int, default=50_000, help="bytes per image")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated concurrency settings")
+    parser.add_argument("--latency", type=float, default=0.02, help="server latency per request, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 5xx")
+    parser.add_argument("--max-rps", type=float, default=None, help="server throttle, requests per second")
+    parser.add_argument("--rate", type=float, default=0, help="client rate limit, requests per second")
+    parser.add_argument("--persisted", action="store_true", help="use persisted queries")
+    parser.add_argument("--compress", choices=["gzip", "deflate"], help="compress request bodies")
+    args = parser.parse_args()
+
+    # quiet the per-page logging
+    logging.getLogger("wikinator").setLevel(logging.ERROR)
+    query_mode = "persisted" if args.persisted else "compact"
+
+    results = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        # a fresh server per run, so every run creates the same pages
+        with StandinWiki(args.latency, args.jitter, args.error_rate, args.max_rps, seed=workers) as wiki:
+            pages = make_pages(args.pages, args.images, args.size, args.image_size)
+            results.append(run(wiki, pages, workers, args.rate, query_mode, args.compress))
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# Tests for the streaming CSV/TSV -> markdown table converter
+import csv
+import io
+import itertools
+
+from tests.standin import StandinWiki
+from wikinator import csvtable
+from wikinator.journal import UploadJournal, content_hash
+from wikinator.registry import registry
+from wikinator.throttle import TransportPolicy
+from wikinator.wiki import GraphIngester
+
+
+def test_table():
+    source = io.StringIO('name,note\nalpha,"a | b"\nbeta,"two\nlines"\ngamma\n')
+    pages = list(csvtable.table_pages(source))
+    assert pages == [("| name | note |\n|---|---|\n"
+                      "| alpha | a \\| b |\n"
+                      "| beta | two<br>lines |\n"
+                      "| gamma |  |\n")]
+
+
+def test_aligned():
+    source = io.StringIO("a\tlonger header\nvalue one\tx\n")
+    pages = list(csvtable.table_pages(source, delimiter="\t", aligned=True))
+    assert pages == [("| a         | longer header |\n"
+                      "|-----------|---------------|\n"
+                      "| value one | x             |\n")]
+
+
+def test_aligned_upload(tmp_path):
+    source = tmp_path / "table.tsv"
+    source.write_text("a\tlonger header\nvalue one\tx\n")
+    # as upload --aligned-tables does
+    registry.register("wikinator.csvtable:load_aligned_file", extensions=[".csv", ".tsv"])
+    try:
+        assert next(registry.load_file(source)).content.startswith("| a         | longer header |\n")
+    finally:
+        registry.register("wikinator.csvtable:load_file", extensions=[".csv", ".tsv"])
+
+
+def test_field_size_limit():
+    limit = csv.field_size_limit()
+    big = "x" * 200_000 # over csv's default limit
+    pages = csvtable.table_pages(io.StringIO(f"a\n{big}\n"))
+    assert big in next(pages)
+    assert list(pages) == []
+    assert csv.field_size_limit() == limit # only raised while reading
+
+
+def test_split():
+    rows = "".join(f"{i},{'x' * 50}\n" for i in range(1000))
+    pages = list(csvtable.table_pages(io.StringIO("id,data\n" + rows), max_size=10_000))
+    assert len(pages) > 5
+    assert all(len(page) <= 10_000 for page in pages)
+    assert all(page.startswith("| id | data |\n|---|---|\n") for page in pages)
+    assert sum(page.count("\n") - 2 for page in pages) == 1000
+
+
+def test_load_file(tmp_path):
+    source = tmp_path / "metrics.csv"
+    source.write_text("id,value\n" + "".join(f"{i},{i * i}\n" for i in range(5000)))
+    pages = registry.load_file(source)
+    first = next(pages) # pages are produced lazily
+    assert first.path.endswith("metrics")
+    rest = list(pages)
+    assert not rest # under the default page size
+
+    pages = list(csvtable.load_file(source, max_size=20_000))
+    assert len(pages) > 2
+    assert pages[1].path.endswith("metrics_part2")
+    assert pages[1].title == "metrics (2)"
+
+
+def test_upload_split_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvtable, "MAX_PAGE_SIZE", 5_000)
+    (tmp_path / "big.csv").write_text("id,value\n" + "".join(f"{i},{i * i}\n" for i in range(2000)))
+    (tmp_path / "page.md").write_text("# page\n")
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        GraphIngester(wiki.url, "token", policy=policy).convert_directory(str(tmp_path), "wiki")
+        paths = sorted(page["path"] for page in wiki.pages.values())
+        parts = [path for path in paths if "big_part" in path]
+        assert len(parts) >= 5
+        assert len(paths) == len(parts) + 2
+
+        # the parts of a file still there aren't pruned
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True, dry_run=True)
+        ingester.convert_directory(str(tmp_path), "wiki")
+        assert ingester.prune_orphans(str(tmp_path), "wiki") == []
+
+
+def test_resume_prune_split_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvtable, "MAX_PAGE_SIZE", 5_000)
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "big.csv").write_text("id,value\n" + "".join(f"{i},{i * i}\n" for i in range(2000)))
+    filename = tmp_path / "upload.jsonl"
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        GraphIngester(wiki.url, "token", policy=policy, journal=UploadJournal(filename)).convert_directory(str(source), "wiki")
+        before = sorted(page["path"] for page in wiki.pages.values())
+        assert len(before) >= 5
+
+        # the unchanged table is skipped, and none of its parts are orphans
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True,
+                                 journal=UploadJournal(filename, resume=True))
+        ingester.convert_directory(str(source), "wiki")
+        assert ingester.skipped == 1
+        assert sorted(page["path"] for page in wiki.pages.values()) == before
+
+
+def test_prune_failed_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvtable, "MAX_PAGE_SIZE", 5_000)
+    (tmp_path / "big.csv").write_text("id,value\n" + "".join(f"{i},{i * i}\n" for i in range(2000)))
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        GraphIngester(wiki.url, "token", policy=policy).convert_directory(str(tmp_path), "wiki")
+        before = sorted(page["path"] for page in wiki.pages.values())
+
+        # the edited table fails to convert after two pages: its other pages stay
+        (tmp_path / "big.csv").write_text("id,value\n" + "".join(f"{i},{i}\n" for i in range(2000)))
+        load_file = registry.load_file
+        def broken(path):
+            yield from itertools.islice(load_file(path), 2)
+            raise csv.Error("bad row")
+        monkeypatch.setattr(registry, "load_file", broken)
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True)
+        ingester.convert_directory(str(tmp_path), "wiki")
+        assert sorted(page["path"] for page in wiki.pages.values()) == before
+
+
+def test_journal_split_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvtable, "MAX_PAGE_SIZE", 5_000)
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "big.csv").write_text("id,value\n" + "".join(f"{i},{i * i}\n" for i in range(2000)))
+    filename = tmp_path / "upload.jsonl"
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        ingester = GraphIngester(wiki.url, "token", policy=policy, workers=4, journal=UploadJournal(filename))
+        update = ingester.db.update
+        # a middle part fails, while the parts after it upload fine
+        monkeypatch.setattr(ingester.db, "update", lambda page: None if page.path.endswith("_part3") else update(page))
+        ingester.convert_directory(str(source), "wiki")
+        assert any(page["path"].endswith("big_part5") for page in wiki.pages.values())
+
+        journal = UploadJournal(filename, resume=True)
+        assert not journal.is_done(source / "big.csv", content_hash(source / "big.csv"))
+        journal.close()
+
+        # once every part is up, the file is done
+        ingester = GraphIngester(wiki.url, "token", policy=policy, workers=4,
+                                 journal=UploadJournal(filename, resume=True))
+        ingester.convert_directory(str(source), "wiki")
+        assert ingester.skipped == 0
+        journal = UploadJournal(filename, resume=True)
+        assert journal.is_done(source / "big.csv", content_hash(source / "big.csv"))
+        journal.close()
+
+
+def test_prune_shrinking_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvtable, "MAX_PAGE_SIZE", 5_000)
+    (tmp_path / "big.csv").write_text("id,value\n" + "".join(f"{i},{i * i}\n" for i in range(2000)))
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        GraphIngester(wiki.url, "token", policy=policy).convert_directory(str(tmp_path), "wiki")
+        before = len(wiki.pages)
+        assert before >= 5
+
+        # the table shrinks to two pages: the parts it no longer has are pruned
+        (tmp_path / "big.csv").write_text("id,value\n" + "".join(f"{i},{i * i}\n" for i in range(400)))
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True)
+        ingester.convert_directory(str(tmp_path), "wiki")
+        paths = sorted(page["path"] for page in wiki.pages.values())
+        assert len(paths) == 2
+        assert paths[0].endswith("/big")
+        assert paths[1].endswith("/big_part2")
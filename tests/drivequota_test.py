@@ -0,0 +1,85 @@
+# Tests for the Drive API scheduler: per-kind quotas, export priority, rate limit backoff
+import threading
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from tests.fakedrive import FakeDrive, fake_drive, http_error
+from wikinator.drivequota import DriveScheduler, is_rate_limited
+
+
+def test_rate_limit_errors():
+    assert is_rate_limited(http_error(403, "userRateLimitExceeded"))
+    assert is_rate_limited(http_error(429, "rateLimitExceeded"))
+    assert not is_rate_limited(http_error(403, "insufficientPermissions"))
+    assert not is_rate_limited(http_error(404))
+
+    scheduler = DriveScheduler(base_delay=0.01)
+    assert scheduler.retry_delay(http_error(404), 0) is None
+    assert scheduler.retry_delay(http_error(503, "backendError"), 0) is not None
+    throttled = HttpError(httplib2.Response({"status": 429, "retry-after": "3"}), b"")
+    assert scheduler.retry_delay(throttled, 0) == 3.0
+    assert scheduler.stats["throttled"] == 1
+
+
+def test_export_priority():
+    scheduler = DriveScheduler(rate=40, burst=1)
+    order = []
+    lock = threading.Lock()
+
+    def call(kind:str):
+        scheduler.admit(kind)
+        with lock:
+            order.append(kind)
+
+    threads = [threading.Thread(target=call, args=("metadata",)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.03) # metadata calls are queued first
+    exports = [threading.Thread(target=call, args=("export",)) for _ in range(3)]
+    for thread in exports:
+        thread.start()
+    for thread in threads + exports:
+        thread.join()
+
+    # the exports overtake the metadata calls already waiting
+    positions = [n for n, kind in enumerate(order) if kind == "export"]
+    assert max(positions) <= 5
+
+
+def test_kind_quota():
+    scheduler = DriveScheduler(rate=0, burst=1, rates={"list": 50, "metadata": 300})
+    start = time.perf_counter()
+    for _ in range(6):
+        scheduler.admit("list")
+    assert time.perf_counter() - start >= 0.09 # 5 waits at 50/s
+    start = time.perf_counter()
+    scheduler.admit("metadata", 150) # a batch, bigger than the bucket
+    assert time.perf_counter() - start >= 0.4
+
+
+def test_throttled_drive(tmp_path):
+    fake = FakeDrive()
+    fake.add_folder("root", "My Drive")
+    for i in range(30):
+        fake.add_folder(f"dir{i}", f"dir {i}", "root")
+        fake.add(f"doc{i}", f"doc {i}", f"dir{i}", content=b"# doc\n")
+    scheduler = DriveScheduler(base_delay=0.01, max_delay=0.05)
+    drive = fake_drive(tmp_path, fake, scheduler=scheduler)
+
+    fake.throttle = 3
+    items = list(drive.list_files("application/vnd.google-apps.document"))
+    assert len(items) == 30
+    assert scheduler.stats["retries"] == 3
+
+    # rate limited lookups in a batch are sent again, the others are not
+    fake.throttle = 5
+    fake.calls.clear()
+    paths = drive.resolve_paths(items)
+    assert paths[0] == "My Drive/dir 0/doc 0"
+    assert fake.calls["batch"] == 2 + 1 # the folders, their retry, the root
+
+    fake.throttle = 2
+    assert len(list(drive.export_pages(items[:4], workers=2))) == 4
+    assert scheduler.stats["throttled"] == 3 + 5 + 2
@@ -0,0 +1,263 @@
+# A stand-in for the Google Drive v3 service object, for tests without network access
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from wikinator.drivequota import KIND_RATES, DriveScheduler
+from wikinator.gdrive import GoogleDrive
+from wikinator.registry import MIMETYPE_DOCX, MIMETYPE_FOLDER, MIMETYPE_GDOC
+
+
+def http_error(status:int, reason:str = "notFound", message:str = "") -> HttpError:
+    content = json.dumps({"error": {"code": status, "message": message,
+                                    "errors": [{"reason": reason, "message": message}]}}).encode()
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+def unthrottled() -> DriveScheduler:
+    """A scheduler without rate limits, so tests against the fake run at full speed"""
+    return DriveScheduler(rate=0, rates={kind: 0 for kind in KIND_RATES})
+
+
+def fake_drive(tmp_path, fake, **kwargs) -> GoogleDrive:
+    """A GoogleDrive on the `fake` service, configured in tmp_path, unthrottled unless a scheduler is given"""
+    kwargs.setdefault("scheduler", unthrottled())
+    return GoogleDrive(str(tmp_path), {}, service=fake, http=fake.http, **kwargs)
+
+
+class FakeRequest:
+    def __init__(self, drive, method:str, func, **kwargs):
+        self.drive = drive
+        self.method = method
+        self.func = func
+        self.kwargs = kwargs
+
+
+    def execute(self, num_retries:int = 0):
+        with self.drive.lock:
+            self.drive.calls[self.method] += 1
+        self.drive.admit()
+        if self.method == "export" and self.drive.latency:
+            time.sleep(self.drive.latency)
+        return self.func()
+
+
+class FakeFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+
+    def get(self, fileId:str, fields:str | None = None, **kwargs) -> FakeRequest:
+        return FakeRequest(self.drive, "get", lambda: self.drive.metadata(fileId), fileId=fileId)
+
+
+    def list(self, q:str = "", pageSize:int = 100, fields:str | None = None, pageToken:str | None = None, **kwargs) -> FakeRequest:
+        def page():
+            matches = [item for item in self.drive.items.values() if self.drive.matches(item, q)]
+            start = int(pageToken or 0)
+            result = {"files": [dict(item) for item in matches[start:start + pageSize]]}
+            if start + pageSize < len(matches):
+                result["nextPageToken"] = str(start + pageSize)
+            return result
+        return FakeRequest(self.drive, "list", page, q=q, pageSize=pageSize, fields=fields, pageToken=pageToken)
+
+
+    def list_next(self, request:FakeRequest, results:dict) -> FakeRequest | None:
+        token = results.get("nextPageToken")
+        if not token:
+            return None
+        return self.list(**{**request.kwargs, "pageToken": token})
+
+
+    def export(self, fileId:str, mimeType:str) -> FakeRequest:
+        def content():
+            data = self.drive.content(fileId)
+            if self.drive.export_limit is not None and len(data) > self.drive.export_limit:
+                raise http_error(403, "exportSizeLimitExceeded", "This file is too large to be exported.")
+            return data
+        return FakeRequest(self.drive, "export", content, fileId=fileId)
+
+
+class FakeChanges:
+    def __init__(self, drive):
+        self.drive = drive
+
+
+    def getStartPageToken(self, **kwargs) -> FakeRequest:
+        return FakeRequest(self.drive, "changes.start", lambda: {"startPageToken": str(len(self.drive.log))})
+
+
+    def list(self, pageToken:str, pageSize:int = 100, **kwargs) -> FakeRequest:
+        def page():
+            start = int(pageToken)
+            changes = []
+            for id in self.drive.log[start:start + pageSize]:
+                item = self.drive.items.get(id)
+                changes.append({"fileId": id, "removed": item is None, "file": dict(item) if item else None})
+            if start + pageSize < len(self.drive.log):
+                return {"changes": changes, "nextPageToken": str(start + pageSize)}
+            return {"changes": changes, "newStartPageToken": str(len(self.drive.log))}
+        return FakeRequest(self.drive, "changes.list", page)
+
+
+class FakeBatch:
+    def __init__(self, drive, callback):
+        self.drive = drive
+        self.callback = callback
+        self.requests = []
+
+
+    def add(self, request:FakeRequest, callback = None, request_id:str | None = None):
+        assert len(self.requests) < 100
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+
+    def execute(self):
+        self.drive.calls["batch"] += 1
+        for request_id, request, callback in self.requests:
+            try:
+                self.drive.admit()
+                response = request.func()
+            except HttpError as ex:
+                callback(request_id, None, ex)
+            else:
+                callback(request_id, response, None)
+
+
+class FakeHttp:
+    """Serves exportLinks downloads, honouring Range headers like Drive does"""
+    def __init__(self, drive):
+        self.drive = drive
+
+
+    def request(self, uri:str, method:str = "GET", body = None, headers:dict | None = None, **kwargs):
+        with self.drive.lock:
+            self.drive.calls["download"] += 1
+        id = re.search(r"/export/([^?]+)", uri).group(1)
+        if id not in self.drive.contents:
+            return httplib2.Response({"status": 404}), b"Not found"
+        data = self.drive.contents[id]
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if match is None:
+            return httplib2.Response({"status": 200, "content-length": str(len(data))}), data
+        start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+        return httplib2.Response({"status": 206, "content-range": f"bytes {start}-{end}/{len(data)}"}), data[start:end + 1]
+
+
+class FakeDrive:
+    """Drive files in memory, counting the requests executed per method"""
+    def __init__(self, latency:float = 0):
+        self.items = {}
+        self.contents = {}
+        self.calls = Counter()
+        self.latency = latency # seconds per export
+        self.log = [] # changed file ids, in order: a page token is an index into it
+        self.lock = threading.Lock()
+        self.export_limit = None # bytes files().export returns, at most: Drive's is 10MB
+        self.throttle = 0 # the next requests to reject with userRateLimitExceeded
+        self.http = FakeHttp(self) # serves the export links
+
+
+    def admit(self):
+        with self.lock:
+            if self.throttle <= 0:
+                return
+            self.throttle -= 1
+        raise http_error(403, "userRateLimitExceeded", "User Rate Limit Exceeded")
+
+
+    def add(self, id:str, name:str, parent:str | None = None, mimeType:str = MIMETYPE_GDOC,
+            content:bytes = b"", version:int = 1):
+        self.items[id] = {
+            "id": id,
+            "name": name,
+            "mimeType": mimeType,
+            "parents": [parent] if parent else [],
+            "version": str(version),
+            "modifiedTime": f"2026-01-01T00:00:{version:02d}.000Z",
+            "starred": False,
+        }
+        self.contents[id] = content
+        self.log.append(id)
+        return self.items[id]
+
+
+    def update(self, id:str, content:bytes):
+        item = self.items[id]
+        item["version"] = str(int(item["version"]) + 1)
+        self.contents[id] = content
+        self.log.append(id)
+
+
+    def move(self, id:str, name:str | None = None, parent:str | None = None):
+        """Rename a file, or move it to another folder"""
+        item = self.items[id]
+        if name is not None:
+            item["name"] = name
+        if parent is not None:
+            item["parents"] = [parent]
+        self.log.append(id)
+
+
+    def remove(self, id:str):
+        del self.items[id]
+        del self.contents[id]
+        self.log.append(id)
+
+
+    def add_folder(self, id:str, name:str, parent:str | None = None):
+        return self.add(id, name, parent, MIMETYPE_FOLDER)
+
+
+    def metadata(self, id:str) -> dict:
+        if id not in self.items:
+            raise http_error(404, "notFound", f"File not found: {id}")
+        item = dict(self.items[id])
+        item["exportLinks"] = {mimeType: f"https://fake.drive/export/{id}?mimeType={mimeType}"
+                               for mimeType in ("text/markdown", MIMETYPE_DOCX)}
+        return item
+
+
+    def content(self, id:str) -> bytes:
+        if id not in self.contents:
+            raise http_error(404, "notFound", f"File not found: {id}")
+        return self.contents[id]
+
+
+    @staticmethod
+    def matches(item:dict, q:str) -> bool:
+        """Evaluate the subset of the Drive query language used by wikinator"""
+        for clause in q.split(" and ") if q else []:
+            clause = clause.strip().strip("()")
+            if clause == "trashed = false":
+                continue
+            if match := re.fullmatch(r"mimeType = '([^']+)'", clause):
+                if item["mimeType"] != match.group(1):
+                    return False
+            elif match := re.fullmatch(r"mimeType != '([^']+)'", clause):
+                if item["mimeType"] == match.group(1):
+                    return False
+            elif "in parents" in clause:
+                parents = re.findall(r"'([^']+)' in parents", clause)
+                if not set(parents) & set(item["parents"]):
+                    return False
+            else:
+                raise ValueError(f"Unsupported query: {clause}")
+        return True
+
+
+    def files(self) -> FakeFiles:
+        return FakeFiles(self)
+
+
+    def changes(self) -> FakeChanges:
+        return FakeChanges(self)
+
+
+    def new_batch_http_request(self, callback = None) -> FakeBatch:
+        return FakeBatch(self, callback)
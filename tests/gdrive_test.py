@@ -0,0 +1,340 @@
+# Tests for the Google Drive client, against a fake Drive service
+import os
+import threading
+import time
+
+from google.oauth2.credentials import Credentials
+
+from tests.fakedrive import FakeDrive, fake_drive
+from wikinator.exportcache import ExportCache
+from wikinator.gdrive import GoogleDrive, build_drive, read_content
+
+
+def make_tree(drive:FakeDrive, docs:int = 100) -> list[dict]:
+    """A folder chain root/team/project/notes with `docs` documents at the bottom"""
+    drive.add_folder("root", "My Drive")
+    drive.add_folder("team", "team", "root")
+    drive.add_folder("project", "project", "team")
+    drive.add_folder("notes", "notes", "project")
+    return [drive.add(f"doc{i}", f"doc {i}", "notes", content=b"# doc\n") for i in range(docs)]
+
+
+def test_folder_paths(tmp_path):
+    fake = FakeDrive()
+    docs = make_tree(fake)
+    drive = fake_drive(tmp_path, fake)
+
+    assert drive.get_parents("doc7") == "My Drive/team/project/notes/doc 7"
+    paths = {drive.get_parents(doc["id"]) for doc in docs}
+    assert len(paths) == 100
+    assert fake.calls["get"] == 104 # each doc, plus each folder once
+
+    # items from a listing already have their names and parents
+    fake.calls.clear()
+    assert drive.folders.item_path(fake.metadata("doc3")) == "My Drive/team/project/notes/doc 3"
+    assert fake.calls["get"] == 0
+    assert drive.get_parents("missing") is None
+
+
+def test_preload_and_persist(tmp_path):
+    fake = FakeDrive()
+    docs = make_tree(fake, 5)
+    drive = fake_drive(tmp_path, fake)
+    drive.preload_folders()
+    assert fake.calls["list"] == 1
+    paths = [drive.folders.item_path(doc) for doc in docs]
+    assert paths[0] == "My Drive/team/project/notes/doc 0"
+    assert fake.calls["get"] == 0
+
+    # a later run starts with the saved folders
+    fake.calls.clear()
+    drive = fake_drive(tmp_path, fake)
+    assert drive.folders.item_path(docs[4]) == "My Drive/team/project/notes/doc 4"
+    assert sum(fake.calls.values()) == 0
+
+
+def test_renamed_folder(tmp_path):
+    fake = FakeDrive()
+    docs = make_tree(fake, 2)
+    fake.add("top", "top doc", "team")
+    drive = fake_drive(tmp_path, fake)
+    drive.preload_folders()
+    assert drive.folders.item_path(docs[0]) == "My Drive/team/project/notes/doc 0"
+    assert drive.folders.item_path(fake.metadata("top")) == "My Drive/team/top doc"
+
+    # only the paths below the renamed folder are resolved again
+    drive.folders.add({**fake.metadata("project"), "name": "renamed"})
+    assert set(drive.folders.paths) == {"root", "team", "top"}
+    assert drive.folders.item_path(docs[1]) == "My Drive/team/renamed/notes/doc 1"
+
+    # a saved folder cache is only trusted for so long
+    drive.folders.save()
+    old = time.time() - 2 * 24 * 3600
+    os.utime(drive.folder_file, (old, old))
+    assert not fake_drive(tmp_path, fake).folders.nodes
+
+
+def test_fetch_outside_lock(tmp_path):
+    fake = FakeDrive()
+    docs = make_tree(fake, 2)
+    drive = fake_drive(tmp_path, fake)
+    drive.preload_folders()
+    fetch = drive.folders.fetch
+    started, release = threading.Event(), threading.Event()
+    def slow(id):
+        started.set()
+        release.wait(5)
+        return fetch(id)
+    drive.folders.fetch = slow
+
+    # while one thread waits on a fetch, the others resolve known paths
+    thread = threading.Thread(target=drive.get_parents, args=("doc1",))
+    thread.start()
+    assert started.wait(5)
+    start = time.monotonic()
+    assert drive.folders.item_path(docs[0]) == "My Drive/team/project/notes/doc 0"
+    assert time.monotonic() - start < 1
+    release.set()
+    thread.join()
+
+
+def test_list_files(tmp_path):
+    fake = FakeDrive()
+    make_tree(fake, 2500)
+    drive = fake_drive(tmp_path, fake)
+
+    items = drive.list_files("application/vnd.google-apps.document")
+    first = next(items)
+    assert fake.calls["list"] == 1 # only the first page so far
+    assert first["id"] == "doc0"
+    assert len(list(items)) == 2499
+    assert fake.calls["list"] == 3
+    assert fake.calls["export"] == 0
+
+    pages = drive.pages(drive.list_files("application/vnd.google-apps.document"))
+    page = next(pages)
+    assert fake.calls["export"] == 1
+    assert page.path == "My Drive/team/project/notes/doc 0"
+
+
+def test_batched_metadata(tmp_path):
+    fake = FakeDrive()
+    fake.add_folder("root", "My Drive")
+    for f in range(30):
+        fake.add_folder(f"team{f}", f"team {f}", "root")
+        for d in range(10):
+            fake.add_folder(f"dir{f}-{d}", f"dir {d}", f"team{f}")
+            fake.add(f"doc{f}-{d}", f"doc {d}", f"dir{f}-{d}")
+    drive = fake_drive(tmp_path, fake)
+
+    found = drive.get_metadata([f"doc{i}-0" for i in range(30)] + ["missing"])
+    assert len(found) == 30 # the missing id fails alone
+    assert fake.calls["batch"] == 1
+
+    fake.calls.clear()
+    items = [item for item in fake.items.values() if item["id"].startswith("doc")]
+    paths = drive.resolve_paths(items)
+    assert paths[0] == "My Drive/team 0/dir 0/doc 0"
+    assert len(set(paths)) == 300
+    # 300 folders, 30 teams, the root: one batch per 100 ids, per level
+    assert fake.calls["batch"] == 3 + 1 + 1
+    assert fake.calls["get"] == 0
+
+
+def test_concurrent_export(tmp_path):
+    fake = FakeDrive(latency=0.02)
+    make_tree(fake, 40)
+    fake.add("bad", "bad doc", "notes")
+    fake.contents.pop("bad") # export fails
+    drive = fake_drive(tmp_path, fake)
+    items = list(drive.list_files("application/vnd.google-apps.document"))
+
+    start = time.perf_counter()
+    pages = list(drive.export_pages(items, workers=8))
+    elapsed = time.perf_counter() - start
+
+    assert len(pages) == 40
+    assert {page.path for page in pages} == {f"My Drive/team/project/notes/doc {i}" for i in range(40)}
+    assert fake.calls["export"] == 41
+    assert elapsed < 41 * 0.02 / 3 # serial would take 0.82s
+
+
+def test_sync(tmp_path):
+    fake = FakeDrive()
+    make_tree(fake, 1200)
+    drive = fake_drive(tmp_path, fake)
+    assert len(list(drive.sync_pages())) == 1200 # first sync exports everything
+
+    fake.update("doc5", b"# changed\n")
+    fake.update("doc700", b"# changed\n")
+    fake.remove("doc9")
+    fake.add("new", "new doc", "notes")
+    fake.add_folder("other", "other", "team")
+    fake.calls.clear()
+
+    drive = fake_drive(tmp_path, fake)
+    pages = list(drive.sync_pages())
+    assert sorted(page.title for page in pages) == ["doc 5", "doc 700", "new doc"]
+    assert drive.removed == ["doc9"]
+    assert fake.calls["export"] == 3
+    assert fake.calls["list"] == 0
+
+    # nothing changed since
+    drive = fake_drive(tmp_path, fake)
+    assert list(drive.sync_pages()) == []
+
+
+def test_export_cache(tmp_path):
+    fake = FakeDrive()
+    make_tree(fake, 3)
+    fake.contents["doc1"] = b"# doc one\n"
+
+    for _ in range(3):
+        page = fake_drive(tmp_path, fake).get_doc("doc1")
+        assert page.content == b"# doc one\n"
+    assert fake.calls["export"] == 1
+    assert fake.calls["get"] == 3 # freshness is checked every time
+
+    fake.update("doc1", b"# doc one, edited\n")
+    assert fake_drive(tmp_path, fake).get_doc("doc1").content == b"# doc one, edited\n"
+    assert fake.calls["export"] == 2
+
+
+def test_export_cache_eviction(tmp_path):
+    cache = ExportCache(str(tmp_path), max_size=20_000)
+    for i in range(10):
+        cache.put(f"doc{i}", "1", "text/markdown", os.urandom(4000)) # incompressible
+        time.sleep(0.01)
+    assert cache.get("doc9", "1", "text/markdown") is not None
+    assert cache.get("doc0", "1", "text/markdown") is None # least recently used
+    assert cache.size <= 20_000
+    assert cache.stats["evicted"] >= 5
+
+
+def test_export_cache_size(tmp_path):
+    cache = ExportCache(str(tmp_path))
+    data = os.urandom(4000)
+    for _ in range(3):
+        cache.put("doc", "1", "text/markdown", data) # unchanged: not written again
+    assert cache.size == os.path.getsize(cache._filename(cache.key("doc", "1", "text/markdown")))
+    assert ExportCache(str(tmp_path)).get("doc", "1", "text/markdown") == data
+
+
+def test_walk(tmp_path):
+    fake = FakeDrive()
+    fake.add_folder("top", "Team Drive")
+    expected = set()
+    for a in range(6):
+        fake.add_folder(f"a{a}", f"area {a}", "top")
+        for b in range(8):
+            fake.add_folder(f"a{a}b{b}", f"box {b}", f"a{a}")
+            for d in range(3):
+                fake.add(f"doc{a}-{b}-{d}", f"doc {d}", f"a{a}b{b}")
+                expected.add(f"Team Drive/area {a}/box {b}/doc {d}")
+            fake.add(f"img{a}-{b}", "image.png", f"a{a}b{b}", mimeType="image/png")
+    fake.add_folder("elsewhere", "elsewhere")
+    fake.add("outside", "outside", "elsewhere")
+    drive = fake_drive(tmp_path, fake)
+
+    docs = drive.known_files("top")
+    first = next(docs) # streamed, before the whole tree is listed
+    assert first["id"].startswith("doc")
+    docs = [first] + list(docs)
+    assert len(docs) == 6 * 8 * 3
+    # top, then 6 areas in one query, then 48 boxes in two
+    assert fake.calls["list"] == 1 + 1 + 2
+    assert {drive.folders.item_path(doc) for doc in docs} == expected
+    assert fake.calls["get"] == 1
+
+    assert [item["id"] for item in drive.known_files("outside")] == ["outside"]
+    assert len(drive.get_children("a0")) == 8
+    assert list(drive.known_files("missing")) == []
+
+
+def test_large_export(tmp_path):
+    fake = FakeDrive()
+    make_tree(fake, 1)
+    big = b"# big\n" + b"lorem ipsum dolor sit amet\n" * 4000 # ~108k
+    fake.add("big", "big doc", "notes", content=big)
+    fake.export_limit = 50_000
+    drive = fake_drive(tmp_path, fake)
+
+    with drive.export_stream(fake.metadata("big"), "text/markdown", chunksize=32 * 1024) as f:
+        assert not f._rolled # kept in memory
+        assert f.read() == big
+    assert fake.calls["download"] == 4
+
+    # past spool_size, it spills to a temp file
+    drive.spool_size = 64 * 1024
+    with drive.export_stream(fake.metadata("big"), "text/markdown", chunksize=32 * 1024) as f:
+        assert f._rolled
+        assert f.read() == big
+    assert fake.calls["get"] == 0 # the links came with the metadata
+
+    # too large for files().export: falls back to streaming
+    drive.preload_folders()
+    fake.calls.clear()
+    page = drive.get_page(fake.items["big"])
+    assert page.content == big.decode()
+    assert fake.calls["export"] == 1
+    assert fake.calls["get"] == 1 # for the export links
+    assert fake.calls["download"] == 1
+    assert read_content(drive.export(fake.items["doc0"], "text/markdown")) == b"# doc\n"
+
+
+def test_lazy_service(tmp_path):
+    # no token and no client config: constructing must not try to authorize
+    drive = GoogleDrive(str(tmp_path), {})
+    assert drive._service is None
+    assert not os.path.exists(drive.token_file)
+
+    # the bundled discovery document builds a service offline
+    service = build_drive(credentials=Credentials(token="test"))
+    assert service.files().get(fileId="abc").uri.startswith("https://www.googleapis.com/drive/v3/files/abc")
+
+    # credentials are shared by every instance using the same token
+    creds = Credentials(token="test")
+    creds.expiry = None # never expires
+    GoogleDrive._credentials[drive.token_file] = creds
+    try:
+        assert GoogleDrive(str(tmp_path), {}).service is not None
+        assert GoogleDrive(str(tmp_path), {})._thread_service() is not None
+    finally:
+        GoogleDrive._credentials.pop(drive.token_file)
+    assert not os.path.exists(drive.token_file) # valid cached credentials are not rewritten
+
+
+def test_sync_retries_failures(tmp_path):
+    fake = FakeDrive()
+    make_tree(fake, 5)
+    content = fake.contents.pop("doc2") # its export fails
+    drive = fake_drive(tmp_path, fake)
+    assert len(list(drive.sync_pages())) == 4
+    assert drive.failed == ["doc2"]
+
+    # nothing changed, but the failed doc is exported again
+    fake.contents["doc2"] = content
+    fake.calls.clear()
+    drive = fake_drive(tmp_path, fake)
+    assert [page.title for page in drive.sync_pages()] == ["doc 2"]
+    assert fake.calls["export"] == 1
+
+    drive = fake_drive(tmp_path, fake)
+    assert list(drive.sync_pages()) == []
+
+
+def test_scoped_sync(tmp_path):
+    fake = FakeDrive()
+    make_tree(fake, 3)
+    fake.add("other", "other", "root") # outside the scope
+    fake.calls.clear()
+
+    # the first sync of a folder only walks that folder
+    drive = fake_drive(tmp_path, fake)
+    assert sorted(item["id"] for item in drive.sync_items(scope="project")) == ["doc0", "doc1", "doc2"]
+    drive.finish_sync(scope="project")
+    assert fake.calls["list"] == 2 # project, then notes
+
+    fake.update("doc1", b"# doc one, edited\n")
+    drive = fake_drive(tmp_path, fake)
+    assert [item["id"] for item in drive.sync_items(scope="project")] == ["doc1"]
@@ -0,0 +1,76 @@
+# Tests for the HTML -> markdown document converter
+import logging
+import time
+from collections import defaultdict
+
+from wikinator import htmldoc
+from wikinator.htmldoc import (
+    Document,
+    HtmlConverter,
+    make_md_anchor,
+    parse_html,
+    preprocess_soup,
+)
+
+log = logging.getLogger(__name__)
+
+
+SAMPLE = """<html><head><title>Design Notes</title><script>var x = 1;</script></head>
+<body>
+<h1><a name="h.abc"></a>Design Notes</h1>
+<dl><dt><a href="#h.abc">Design Notes</a></dt><dd><dl><dt><a href="#h.def">Sub Part</a></dt></dl></dd>
+<dt>Plain entry</dt><dt><a href="http://example.com/z">External</a></dt></dl>
+<h2><a name="h.def"></a>Sub Part</h2><p>Some <b>bold</b> text&nbsp;here.</p>
+</body></html>"""
+
+
+def test_html_converter():
+    page = HtmlConverter().convert(Document("https://example.com/pub/notes", "text/html", SAMPLE))
+    assert page.title == "Design Notes"
+    assert page.path == "example.com//pub/notes"
+    assert "var x" not in page.content
+    assert "# Design Notes" in page.content
+    # the TOC points at the markdown heading anchors
+    assert "* [Design Notes](#design-notes)\n  * [Sub Part](#sub-part)" in page.content
+    assert "* [Plain entry](#plain-entry)" in page.content
+    assert "* External" in page.content
+    assert "Some **bold** text here." in page.content
+
+
+def test_md_anchor():
+    counter = defaultdict(int)
+    assert make_md_anchor("Sub Part", counter) == "#sub-part"
+    assert make_md_anchor("Sub -- Part!", counter) == "#sub-part-1"
+    assert make_md_anchor("snake_case", counter) == "#snake_case"
+
+
+def toc_html(chapters:int, parts:int) -> str:
+    """A document with a nested definition list TOC of chapters * (parts + 1) entries"""
+    toc, body = [], []
+    for n in range(chapters):
+        toc.append(f'<dt><a href="#h.{n}">Chapter {n}</a></dt><dd><dl>')
+        body.append(f'<h1><a name="h.{n}"></a>Chapter {n}</h1><p>text</p>')
+        for p in range(parts):
+            toc.append(f'<dt><a href="#h.{n}.{p}">Part {p}</a></dt>')
+            body.append(f'<h2><a name="h.{n}.{p}"></a>Part {p}</h2><p>text</p>')
+        toc.append("</dl></dd>")
+    return f"<html><head><title>TOC</title></head><body><dl>{''.join(toc)}</dl>{''.join(body)}</body></html>"
+
+
+def test_benchmark_toc(monkeypatch):
+    soup = parse_html(toc_html(1000, 4))
+    parsers = []
+    monkeypatch.setattr(htmldoc, "BeautifulSoup", lambda *args: parsers.append(args))
+
+    start = time.perf_counter()
+    preprocess_soup(soup)
+    elapsed = time.perf_counter() - start
+    log.info(f"rewrote a 5000 entry TOC in {elapsed:.2f}s")
+
+    assert parsers == [] # built on the document's own tree
+    assert soup.find("dl") is None
+    items = soup.find_all("li")
+    assert len(items) == 5000
+    assert items[0].contents[0] == "[Chapter 0](#chapter-0)"
+    assert items[1].get_text() == "[Part 0](#part-0)"
+    assert items[-1].get_text() == "[Part 3](#part-3-999)"
@@ -0,0 +1,99 @@
+# Tests for the resumable upload journal
+import zipfile
+
+from tests.standin import StandinWiki
+from wikinator.archive import PageArchive
+from wikinator.journal import UploadJournal, content_hash
+from wikinator.throttle import TransportPolicy
+from wikinator.wiki import GraphIngester
+
+
+def test_replay(tmp_path):
+    filename = tmp_path / "upload.jsonl"
+    with UploadJournal(filename, batch_size=2) as journal:
+        journal.record("a.md", 1, "aaa")
+        journal.record("b.md", 2, "bbb")
+        journal.record("c.md", 3, "ccc")
+
+    # a run that died mid-write
+    with open(filename, "a") as file:
+        file.write('{"path": "d.md", "id"')
+
+    journal = UploadJournal(filename, resume=True)
+    assert journal.is_done("a.md", "aaa")
+    assert journal.is_done("c.md", "ccc")
+    assert not journal.is_done("b.md", "changed")
+    assert not journal.is_done("d.md", "ddd")
+    journal.close()
+
+    # without resume, start over
+    journal = UploadJournal(filename)
+    assert not journal.is_done("a.md", "aaa")
+    journal.close()
+    assert filename.read_text() == ""
+
+
+def test_torn_tail_resume(tmp_path):
+    filename = tmp_path / "upload.jsonl"
+    with UploadJournal(filename) as journal:
+        journal.record("a.md", 1, "aaa")
+    with open(filename, "a") as file:
+        file.write('{"path": "b.md", "id"') # died mid-write
+
+    # the next entry isn't glued to the torn line, and survives another resume
+    with UploadJournal(filename, resume=True) as journal:
+        journal.record("c.md", 3, "ccc")
+    journal = UploadJournal(filename, resume=True)
+    assert journal.is_done("a.md", "aaa")
+    assert journal.is_done("c.md", "ccc")
+    assert not journal.is_done("b.md", "bbb")
+    journal.close()
+    assert len(filename.read_text().splitlines()) == 2
+
+
+def test_resume_upload(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    for name in ["one", "two", "three"]:
+        (source / f"{name}.md").write_text(f"# {name}\n")
+    filename = tmp_path / "upload.jsonl"
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        ingester = GraphIngester(wiki.url, "token", policy=policy, journal=UploadJournal(filename))
+        ingester.convert_directory(str(source), "/")
+        assert len(wiki.pages) == 3
+
+        # change one file, resume: only that one is uploaded
+        (source / "two.md").write_text("# two, again\n")
+        ingester = GraphIngester(wiki.url, "token", policy=policy,
+                                 journal=UploadJournal(filename, resume=True))
+        ingester.convert_directory(str(source), "/")
+        assert ingester.skipped == 2
+        assert any(page["content"] == "# two, again\n" for page in wiki.pages.values())
+
+    journal = UploadJournal(filename, resume=True)
+    assert journal.is_done(source / "two.md", content_hash(source / "two.md"))
+    journal.close()
+
+
+def test_resume_archive(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    for name in ["one", "two"]:
+        (source / f"{name}.md").write_text(f"# {name}\n")
+    filename = tmp_path / "upload.jsonl"
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        GraphIngester(wiki.url, "token", policy=policy, journal=UploadJournal(filename)).convert_directory(str(source), "/")
+        calls = policy.stats["calls"]
+
+        # the files already uploaded aren't sent again, but they're still archived
+        ingester = GraphIngester(wiki.url, "token", policy=policy, journal=UploadJournal(filename, resume=True),
+                                 archive=PageArchive(tmp_path / "out.zip"))
+        ingester.convert_directory(str(source), "/")
+        assert ingester.skipped == 2
+        assert policy.stats["calls"] == calls + 1 # listing the pages
+    with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+        assert len([name for name in archive.namelist() if name.endswith(".md")]) == 2
@@ -0,0 +1,48 @@
+# Tests for include/exclude filtering of the directory walk
+import os
+
+from wikinator.pathmatch import PathMatcher
+from wikinator.pipeline import discover
+
+
+def test_matcher():
+    matcher = PathMatcher(include=["*.md", "*.docx"], exclude=["node_modules", "archive/", "docs/*.tmp.md", "**/draft-*"])
+    assert matcher.included("readme.md")
+    assert matcher.included("a/b/page.docx")
+    assert not matcher.included("a/b/page.txt")
+    assert matcher.excluded("x/node_modules", is_dir=True)
+    assert matcher.excluded("archive", is_dir=True)
+    assert not matcher.excluded("archive") # dir-only pattern
+    assert not matcher.included("docs/notes.tmp.md")
+    assert matcher.included("other/docs/notes.tmp.md") # anchored pattern
+    assert not matcher.included("a/b/draft-1.md")
+
+    everything = PathMatcher()
+    assert everything.included("any/file.bin")
+    assert not everything.excluded("any", is_dir=True)
+
+
+def test_discover_filters(tmp_path):
+    for name in ["keep.md", "skip.txt", "node_modules/pkg/readme.md", "docs/page.md",
+                 "docs/old/page.md", "docs/private/secret.md", "docs/draft.md"]:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text("x")
+    (tmp_path / "docs" / ".wikinatorignore").write_text("# local excludes\nold/\n\ndraft.md\n")
+    (tmp_path / "docs" / "private" / ".wikinatorignore").write_text("*\n")
+
+    matcher = PathMatcher(include=["*.md"], exclude=["node_modules"])
+    found = sorted(str(path.relative_to(tmp_path)) for path in discover(tmp_path, matcher))
+    assert found == ["docs/page.md", "keep.md"]
+
+
+def test_pruned_directory_not_read(tmp_path, monkeypatch):
+    (tmp_path / "node_modules" / "deep").mkdir(parents=True)
+    (tmp_path / "page.md").write_text("x")
+
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scanned.append(str(path)) or scandir(path))
+
+    found = list(discover(tmp_path, PathMatcher(exclude=["node_modules"])))
+    assert [path.name for path in found] == ["page.md"]
+    assert scanned == [str(tmp_path)]
@@ -0,0 +1,85 @@
+# Tests for the staged discover -> convert -> upload pipeline
+import threading
+import time
+
+from tests.standin import StandinWiki
+from wikinator.pipeline import Pipeline, discover
+from wikinator.throttle import TransportPolicy
+from wikinator.wiki import GraphIngester
+
+
+def test_discover(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    for name in ["top.md", "a/one.md", "a/b/two.docx"]:
+        (tmp_path / name).write_text("x")
+    found = sorted(str(path.relative_to(tmp_path)) for path in discover(tmp_path))
+    assert found == ["a/b/two.docx", "a/one.md", "top.md"]
+
+
+def test_stages():
+    results = []
+    lock = threading.Lock()
+
+    def collect(item):
+        with lock:
+            results.append(item)
+
+    def split(i):
+        if i % 10 == 0:
+            raise ValueError("bad item")
+        return [i, -i] if i % 3 == 0 else i
+
+    pipeline = Pipeline(range(50), maxsize=2)
+    pipeline.add_stage("split", split, workers=3)
+    pipeline.add_stage("collect", collect)
+    pipeline.run()
+
+    assert pipeline.discovered == 50
+    assert pipeline.stages[0].count == 50
+    assert pipeline.stages[0].errors == 5
+    expected = [i for i in range(50) if i % 10] + [-i for i in range(50) if i % 10 and i % 3 == 0]
+    assert sorted(results) == sorted(expected)
+    assert pipeline.stages[1].count == len(expected)
+
+
+def test_backpressure():
+    # a slow last stage holds back the producer, instead of queueing everything
+    produced = []
+
+    def source():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    pipeline = Pipeline(source(), maxsize=2)
+    pipeline.add_stage("slow", lambda i: time.sleep(0.05))
+    thread = threading.Thread(target=pipeline.run)
+    thread.start()
+    time.sleep(0.1)
+    assert len(produced) < 10
+    thread.join()
+    assert len(produced) == 20
+
+
+def test_upload(tmp_path):
+    for i in range(12):
+        (tmp_path / f"page{i}.md").write_text(f"# Page {i}\n\nsome text\n")
+    (tmp_path / "notes.txt").write_text("not a page")
+
+    with StandinWiki(latency=0.01) as wiki:
+        ingester = GraphIngester(wiki.url, "token", policy=TransportPolicy(rate=0), workers=4)
+        pipeline = ingester.convert_directory(str(tmp_path), "wiki")
+        assert len(wiki.pages) == 12
+        assert pipeline.stages[0].count == 13
+        assert pipeline.stages[1].count == 12
+        assert not ingester.db.failures
+
+
+def test_fan_out_iterator():
+    results = []
+    pipeline = Pipeline(range(5), maxsize=1)
+    pipeline.add_stage("expand", lambda i: (i * 10 + j for j in range(i)))
+    pipeline.add_stage("collect", results.append)
+    pipeline.run()
+    assert sorted(results) == sorted(i * 10 + j for i in range(5) for j in range(i))
+    assert pipeline.stages[1].count == 10
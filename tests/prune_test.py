@@ -0,0 +1,95 @@
+# Tests for pruning wiki pages that no longer have a source file
+
+import aiohttp
+
+from tests.standin import StandinWiki
+from wikinator.page import Page
+from wikinator.pathmatch import PathMatcher
+from wikinator.throttle import TransportPolicy
+from wikinator.wiki import GraphDB, GraphIngester
+
+
+def stub_page(path:str) -> Page:
+    return Page.load({"content": "x", "path": path, "title": path, "description": ""})
+
+
+def test_delete_pages():
+    with StandinWiki() as wiki:
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+        for i in range(30):
+            db.create(stub_page(f"docs/page{i}"))
+        db.create(stub_page("docs2/page"))
+        assert len(db.pages_under("docs")) == 30
+
+        deleted = db.delete_pages(db.pages_under("docs"), batch_size=7, workers=3)
+        assert deleted == 30
+        assert list(db.pageCache) == ["docs2/page"]
+        assert len(wiki.pages) == 1
+
+
+def test_transport_failures(monkeypatch):
+    # errors the policy gives up retrying are recorded as failures, not raised
+    with StandinWiki() as wiki:
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+        db.create(stub_page("docs/a"))
+        db.create(stub_page("docs/b"))
+
+        errors = [aiohttp.ClientConnectionError("connection reset"), TimeoutError()]
+        def broken(query, variables=None):
+            raise errors.pop(0)
+        monkeypatch.setattr(db, "_execute", broken)
+
+        assert db.update(stub_page("docs/a")) is None
+        assert db.delete_pages(db.pages_under("docs")) == 0
+        assert db.failures == ["docs/a", "docs/a", "docs/b"]
+        assert len(wiki.pages) == 2
+
+
+def test_prune(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    for name in ["keep", "remove"]:
+        (source / f"{name}.md").write_text(f"# {name}\n")
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        GraphIngester(wiki.url, "token", policy=policy).convert_directory(str(source), "wiki")
+        GraphDB(wiki.url, "token", policy).create(stub_page("other/page")) # outside the uploaded tree
+        assert len(wiki.pages) == 3
+
+        (source / "remove.md").unlink()
+
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True, dry_run=True)
+        ingester.convert_directory(str(source), "wiki")
+        assert len(wiki.pages) == 3
+
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True)
+        ingester.convert_directory(str(source), "wiki")
+        paths = sorted(page["path"] for page in wiki.pages.values())
+        assert len(paths) == 2
+        assert paths[0] == "other/page"
+        assert paths[1].endswith("src/keep")
+
+
+def test_prune_keeps_excluded(tmp_path):
+    source = tmp_path / "src"
+    (source / "drafts").mkdir(parents=True)
+    for name in ["keep.md", "skip.md", "drafts/one.md"]:
+        (source / name).write_text(f"# {name}\n")
+
+    with StandinWiki() as wiki:
+        policy = TransportPolicy(rate=0)
+        GraphIngester(wiki.url, "token", policy=policy).convert_directory(str(source), "wiki")
+        assert len(wiki.pages) == 3
+
+        # excluding files and directories from a run doesn't make their pages orphans
+        (source / "drafts" / ".wikinatorignore").write_text("*.md\n")
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True,
+                                 matcher=PathMatcher(exclude=["skip.md"]))
+        ingester.convert_directory(str(source), "wiki")
+        assert len(wiki.pages) == 3
+
+        ingester = GraphIngester(wiki.url, "token", policy=policy, prune=True,
+                                 matcher=PathMatcher(exclude=["drafts/"]))
+        ingester.convert_directory(str(source), "wiki")
+        assert len(wiki.pages) == 3
@@ -0,0 +1,65 @@
+# Tests for the pre-parsed GraphQL documents used by GraphDB
+import logging
+import time
+
+from gql import gql
+from graphql import print_ast
+
+from wikinator.queries import CREATE_PAGE, UPDATE_PAGE, is_persisted_query_miss
+
+log = logging.getLogger(__name__)
+
+PAGE_VARS = {
+    "id": 42,
+    "content": "# Hello\n\nSome content",
+    "description": "test",
+    "editor": "markdown",
+    "isPublished": True,
+    "isPrivate": True,
+    "locale": "en",
+    "path": "test/hello",
+    "tags": ["gdocs"],
+    "title": "Hello",
+}
+
+
+def test_compact_payload():
+    payload = UPDATE_PAGE.request(PAGE_VARS).payload
+    assert payload["variables"] == PAGE_VARS
+    assert "extensions" not in payload
+    assert "\n" not in payload["query"]
+    assert payload["query"].startswith("mutation Page(")
+
+
+def test_persisted_payload():
+    payload = CREATE_PAGE.request(PAGE_VARS, "persisted", send_query=False).payload
+    assert "query" not in payload
+    assert payload["extensions"]["persistedQuery"]["sha256Hash"] == CREATE_PAGE.sha256
+
+    # first use sends both
+    payload = CREATE_PAGE.request(PAGE_VARS, "persisted").payload
+    assert payload["query"] == CREATE_PAGE.text
+    assert "persistedQuery" in payload["extensions"]
+
+    assert is_persisted_query_miss(Exception("{'message': 'PersistedQueryNotFound'}"))
+
+
+def test_prepared_query_benchmark():
+    """Per-mutation client cost: parse + print on every request, vs once per process"""
+    rounds = 200
+    text = UPDATE_PAGE.text
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        request = gql(text)
+        request.variable_values = PAGE_VARS
+        print_ast(request.document) # as in GraphQLRequest.payload
+    inline = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        _ = UPDATE_PAGE.request(PAGE_VARS).payload
+    prepared = (time.perf_counter() - start) / rounds
+
+    log.info(f"per mutation: inline={inline * 1e6:.1f}us prepared={prepared * 1e6:.1f}us, {inline / prepared:.0f}x")
+    assert prepared < inline
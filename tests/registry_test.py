@@ -0,0 +1,45 @@
+# Tests for the converter registry
+import subprocess
+import sys
+from pathlib import Path
+
+from wikinator.registry import ConverterRegistry, registry
+
+
+def test_lookup():
+    assert registry.can_load(Path("a/b.MD"))
+    assert registry.can_load(Path("a/b.docx"))
+    assert not registry.can_load(Path("a/b.txt"))
+    assert registry.load_file(Path("a/b.txt")) is None
+    assert type(registry.get("text/html")).__name__ == "HtmlConverter"
+    assert registry.get("application/x-unknown") is None
+
+
+def test_load_markdown(tmp_path):
+    source = tmp_path / "page.md"
+    source.write_text("# Title\n")
+    page = registry.load_file(source)
+    assert page.content == "# Title\n"
+    assert page.title == "page"
+
+
+def test_lazy_import():
+    local = ConverterRegistry()
+    local.register("json:loads", extensions=[".json"])
+    assert ".json" in local.targets and not local.loaded
+    assert local.get(".JSON")('{"a": 1}') == {"a": 1}
+
+
+def test_markdown_upload_skips_heavy_imports(tmp_path):
+    # loading markdown shouldn't import docx, PIL, lxml, bs4 or markdownify
+    (tmp_path / "page.md").write_text("# Title\n")
+    script = f"""
+import sys
+from pathlib import Path
+from wikinator.wiki import GraphIngester
+from wikinator.registry import registry
+assert registry.load_file(Path({str(tmp_path / "page.md")!r})) is not None
+print(sorted(m for m in ["docx", "PIL", "lxml", "bs4", "markdownify"] if m in sys.modules))
+"""
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "[]"
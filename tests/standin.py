@@ -0,0 +1,295 @@
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from aiohttp import web
+from graphql import OperationType, build_schema, graphql_sync
+
+log = logging.getLogger(__name__)
+
+
+# The subset of the wiki.js schema used by GraphDB
+SCHEMA = build_schema('''
+    type ResponseStatus {
+        succeeded: Boolean!
+        errorCode: Int!
+        slug: String!
+        message: String
+    }
+
+    type PageListItem {
+        id: Int!
+        path: String!
+        locale: String!
+        title: String
+        description: String
+    }
+
+    type Page {
+        id: Int!
+        path: String!
+        locale: String!
+        title: String!
+        description: String!
+        content: String!
+        editor: String!
+        isPublished: Boolean!
+        isPrivate: Boolean!
+        tags: [String]!
+    }
+
+    type PageResponse {
+        responseResult: ResponseStatus!
+        page: Page
+    }
+
+    type DefaultResponse {
+        responseResult: ResponseStatus!
+    }
+
+    enum PageOrderBy { CREATED, ID, PATH, TITLE, UPDATED }
+
+    type PageQuery {
+        list(limit: Int, orderBy: PageOrderBy, locale: String): [PageListItem!]!
+        singleByPath(path: String!, locale: String!): Page
+    }
+
+    type PageMutation {
+        create(content: String!, description: String!, editor: String!, isPublished: Boolean!,
+               isPrivate: Boolean!, locale: String!, path: String!, tags: [String]!,
+               title: String!): PageResponse
+        update(id: Int!, content: String, description: String, editor: String, isPublished: Boolean,
+               isPrivate: Boolean, locale: String, path: String, tags: [String],
+               title: String): PageResponse
+        delete(id: Int!): DefaultResponse
+    }
+
+    type Query { pages: PageQuery }
+    type Mutation { pages: PageMutation }
+''')
+
+
+def _result(succeeded:bool = True, code:int = 1, slug:str = "ok", message:str | None = None) -> dict:
+    return {"succeeded": succeeded, "errorCode": code, "slug": slug, "message": message}
+
+
+class _PageQuery:
+    def __init__(self, wiki):
+        self.wiki = wiki
+
+
+    def list(self, info, limit:int = 1000, orderBy:str | None = None, locale:str | None = None):
+        pages = sorted(self.wiki.pages.values(), key=lambda page: page["path"])
+        return pages[:limit]
+
+
+    def singleByPath(self, info, path:str, locale:str):
+        return self.wiki.by_path(path)
+
+
+class _PageMutation:
+    def __init__(self, wiki):
+        self.wiki = wiki
+
+
+    def create(self, info, **page):
+        with self.wiki.lock:
+            if self.wiki.by_path(page["path"]):
+                return {"responseResult": _result(False, 6002, "PageDuplicateCreate",
+                            "Cannot create this page because an entry already exists at the same path."),
+                        "page": None}
+            self.wiki.last_id += 1
+            page["id"] = self.wiki.last_id
+            self.wiki.pages[page["id"]] = page
+        return {"responseResult": _result(), "page": page}
+
+
+    def update(self, info, id:int, **changes):
+        with self.wiki.lock:
+            page = self.wiki.pages.get(id)
+            if page is None:
+                return {"responseResult": _result(False, 6003, "PageNotFound", "This page does not exist."),
+                        "page": None}
+            page.update({k: v for k, v in changes.items() if v is not None})
+        return {"responseResult": _result(), "page": page}
+
+
+    def delete(self, info, id:int):
+        with self.wiki.lock:
+            if self.wiki.pages.pop(id, None) is None:
+                return {"responseResult": _result(False, 6003, "PageNotFound", "This page does not exist.")}
+        return {"responseResult": _result()}
+
+
+class StandinWiki:
+    """
+    In-process stand-in for a wiki.js server, for offline tests and benchmarks.
+    Implements the `pages` GraphQL subset used by GraphDB (list, singleByPath,
+    create, update, delete), automatic persisted queries, and `/u` uploads.
+
+    Server behaviour can be tuned:
+    - latency: seconds added to every request (plus up to `jitter` seconds)
+    - error_rate: fraction of requests answered with a 502/503
+    - max_rps: requests per second before answering 429 with Retry-After
+    - compression: accept compressed (Content-Encoding) request bodies, or answer 415
+
+    Runs its own event loop in a background thread:
+
+        with StandinWiki(latency=0.05) as wiki:
+            db = GraphDB(wiki.url, "token")
+    """
+    def __init__(self, latency:float = 0.0, jitter:float = 0.0, error_rate:float = 0.0,
+                 max_rps:float | None = None, seed:int | None = None, compression:bool = True):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.compression = compression
+        self.random = random.Random(seed)
+
+        self.pages = {}
+        self.uploads = {}
+        self.persisted = {}
+        self.last_id = 0
+        self.lock = threading.Lock()
+        self.stats = {"graphql": 0, "upload": 0, "errors": 0, "throttled": 0, "compressed": 0}
+
+        self._window = (0, 0) # (second, count) for max_rps
+        self._root = {"pages": self._pages}
+        self.loop = None
+        self.thread = None
+        self.port = None
+
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+
+    def by_path(self, path:str) -> dict | None:
+        for page in self.pages.values():
+            if page["path"] == path:
+                return page
+        return None
+
+
+    def _pages(self, info):
+        if info.operation.operation == OperationType.MUTATION:
+            return _PageMutation(self)
+        return _PageQuery(self)
+
+
+    async def _admit(self, kind:str) -> web.Response | None:
+        """Apply latency, throttling and error injection. Returns an error response, or None"""
+        self.stats[kind] += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.max_rps:
+            second = int(time.monotonic())
+            current, count = self._window
+            count = count + 1 if current == second else 1
+            self._window = (second, count)
+            if count > self.max_rps:
+                self.stats["throttled"] += 1
+                return web.Response(status=429, text="Too Many Requests", headers={"Retry-After": "1"})
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=self.random.choice([502, 503]), text="Bad Gateway")
+
+        return None
+
+
+    async def _graphql(self, request:web.Request) -> web.Response:
+        error = await self._admit("graphql")
+        if error:
+            return error
+
+        if request.headers.get("Content-Encoding"):
+            if not self.compression:
+                return web.Response(status=415, text="Unsupported Content-Encoding")
+            self.stats["compressed"] += 1
+
+        body = await request.json() # aiohttp decompresses the body
+        query = body.get("query")
+        persisted = (body.get("extensions") or {}).get("persistedQuery")
+        if persisted:
+            sha = persisted.get("sha256Hash")
+            if query:
+                if hashlib.sha256(query.encode("utf-8")).hexdigest() != sha:
+                    return web.json_response({"errors": [{"message": "provided sha does not match query"}]})
+                self.persisted[sha] = query
+            else:
+                query = self.persisted.get(sha)
+                if query is None:
+                    return web.json_response({"errors": [{
+                        "message": "PersistedQueryNotFound",
+                        "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"},
+                    }]})
+
+        result = graphql_sync(SCHEMA, query, root_value=self._root, variable_values=body.get("variables"))
+        return web.json_response(result.formatted)
+
+
+    async def _upload(self, request:web.Request) -> web.Response:
+        error = await self._admit("upload")
+        if error:
+            return error
+
+        form = await request.post()
+        for field in form.getall("mediaUpload", []):
+            if isinstance(field, web.FileField):
+                self.uploads[field.filename] = field.file.read()
+        return web.Response(text="ok")
+
+
+    def _app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/graphql", self._graphql)
+        app.router.add_post("/u", self._upload)
+        return app
+
+
+    def _run(self, ready:threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.runner = web.AppRunner(self._app())
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", self.port or 0)
+        self.loop.run_until_complete(site.start())
+        self.port = self.runner.addresses[0][1]
+        ready.set()
+        self.loop.run_forever()
+
+
+    def start(self) -> str:
+        """Start serving in a background thread, returning the base URL"""
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        log.info(f"stand-in wiki serving at {self.url}")
+        return self.url
+
+
+    def stop(self):
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.stop()
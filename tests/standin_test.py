@@ -0,0 +1,76 @@
+# Tests for GraphDB against the in-process stand-in wiki
+import pytest
+import requests
+
+from tests.bench import make_pages, run
+from tests.standin import StandinWiki
+from wikinator.page import Page, PageImage
+from wikinator.throttle import TransportPolicy
+from wikinator.wiki import GraphDB
+
+
+@pytest.fixture
+def wiki():
+    with StandinWiki() as wiki:
+        yield wiki
+
+
+def test_create_and_update(wiki):
+    db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+    page = make_pages(1, 1, 100, 100)[0]
+
+    db.update(page) # doesn't exist yet: create
+    assert len(wiki.pages) == 1
+    assert wiki.uploads == {"bench-page-0-image0.png": page.images["rId0"].content}
+
+    # a fresh connection sees the page, and updates it
+    db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+    assert db.id_for_path("bench/page-0") == 1
+    page = Page.load({"content": "new content", "path": "bench/page-0", "title": "Updated", "description": ""})
+    db.update(page)
+    assert wiki.pages[1]["content"] == "new content"
+    assert not db.failures
+
+
+def test_persisted_queries(wiki):
+    db = GraphDB(wiki.url, "token", TransportPolicy(rate=0), query_mode="persisted")
+    for page in make_pages(3, 0, 100, 0):
+        db.update(page)
+    assert len(wiki.pages) == 3
+    assert len(wiki.persisted) == 2 # list and create
+    assert db.policy.stats["failures"] == 0 # a hash the server doesn't know yet isn't a failure
+
+
+def test_retries_through_errors():
+    with StandinWiki(error_rate=0.3, seed=1) as wiki:
+        policy = TransportPolicy(rate=0, base_delay=0.01, retries=10)
+        db = GraphDB(wiki.url, "token", policy)
+        page = Page.load({"content": "content", "path": "flaky", "title": "Flaky", "description": ""})
+        page.add_image("rId1", PageImage("image.png", b"not really a png"))
+        db.update(page)
+
+        assert wiki.stats["errors"] > 0
+        assert policy.stats["retries"] == wiki.stats["errors"]
+        assert wiki.by_path("flaky") is not None
+        assert "flaky-image.png" in wiki.uploads
+
+
+def test_failed_image(wiki, monkeypatch):
+    db = GraphDB(wiki.url, "token", TransportPolicy(rate=0, retries=0))
+    page = make_pages(1, 1, 100, 100)[0]
+    def broken(url, path, image):
+        raise requests.ConnectionError("connection reset")
+    monkeypatch.setattr(db, "_post_image", broken)
+
+    # a page that lost an image failed, so it's sent again next time
+    assert db.update(page) is None
+    assert db.failures == ["bench/page-0"]
+    assert not wiki.pages
+
+
+def test_benchmark_concurrency():
+    with StandinWiki(latency=0.01) as wiki:
+        result = run(wiki, make_pages(20, 1, 1000, 1000), workers=4)
+    assert result["pages"] == 20
+    assert result["failures"] == 0
+    assert result["pages/s"] > 0
@@ -0,0 +1,121 @@
+# Tests for the Drive -> wiki teleport pipeline, against a fake Drive and a stand-in wiki
+from pathlib import Path
+
+from tests.fakedrive import FakeDrive, fake_drive
+from tests.standin import StandinWiki
+from wikinator.teleport import Teleporter
+from wikinator.throttle import TransportPolicy
+from wikinator.wiki import GraphDB
+
+
+def test_teleport(tmp_path):
+    docx = Path("tests/resources/test.docx").read_bytes()
+    fake = FakeDrive()
+    fake.add_folder("root", "My Drive")
+    fake.add_folder("team", "team", "root")
+    fake.add_folder("notes", "notes", "team")
+    for i in range(6):
+        fake.add(f"doc{i}", f"doc {i}", "notes" if i % 2 else "team", content=docx)
+    fake.add("other", "other", "root", content=docx) # outside the mirrored folder
+    # too large for files().export: streamed, and converted from the open file
+    fake.add("big", "big doc", "notes", content=Path("tests/resources/test3.docx").read_bytes())
+    fake.export_limit = 100_000
+    drive = fake_drive(tmp_path, fake, cache=False)
+
+    with StandinWiki() as wiki:
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+        teleporter = Teleporter(drive, db, export_workers=4, processes=2, upload_workers=2, queue_size=2)
+        pipeline = teleporter.run("team", "mirror")
+
+        assert teleporter.uploaded == 7
+        assert [stage.errors for stage in pipeline.stages] == [0, 0, 0]
+        assert fake.calls["download"] == 1
+        assert sorted(page["path"] for page in wiki.pages.values()) == \
+            [f"mirror/team/doc_{i}" for i in (0, 2, 4)] + \
+            ["mirror/team/notes/big_doc"] + [f"mirror/team/notes/doc_{i}" for i in (1, 3, 5)]
+        for path in ["mirror/team/notes/doc_1", "mirror/team/notes/big_doc"]:
+            page = wiki.by_path(path)
+            assert page["content"].strip() and "PK" not in page["content"] # markdown, not DOCX bytes
+    assert list(tmp_path.iterdir()) == [] # no exports, folders or pages written
+
+
+def test_teleport_collision(tmp_path, caplog):
+    docx = Path("tests/resources/test.docx").read_bytes()
+    fake = FakeDrive()
+    fake.add_folder("root", "My Drive")
+    fake.add_folder("team", "team", "root")
+    fake.add("notes1", "Notes", "team", content=docx)
+    fake.add("notes2", "Notes", "team", content=docx)
+    drive = fake_drive(tmp_path, fake, cache=False)
+
+    with StandinWiki() as wiki:
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+        teleporter = Teleporter(drive, db, export_workers=2, processes=1, upload_workers=1)
+        pipeline = teleporter.run("team", "mirror")
+
+        assert teleporter.uploaded == 2
+        assert not teleporter.failed
+        assert [stage.errors for stage in pipeline.stages] == [0, 0, 0]
+        assert "both mirrored to mirror/team/Notes" in caplog.text
+
+
+def test_teleport_changes(tmp_path):
+    docx = Path("tests/resources/test.docx").read_bytes()
+    fake = FakeDrive()
+    fake.add_folder("root", "My Drive")
+    fake.add_folder("team", "team", "root")
+    for i in range(4):
+        fake.add(f"doc{i}", f"doc {i}", "team", content=docx)
+    fake.add("other", "other", "root", content=docx) # outside the mirrored folder
+    fake.contents.pop("doc3") # its export fails
+
+    def teleport():
+        drive = fake_drive(tmp_path, fake, cache=False)
+        teleporter = Teleporter(drive, db, export_workers=2, processes=1, upload_workers=2, changes=True)
+        teleporter.run("team", "mirror")
+        return teleporter
+
+    with StandinWiki() as wiki:
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+        teleporter = teleport()
+        assert teleporter.uploaded == 3
+        assert teleporter.failed == ["doc3"]
+
+        fake.contents["doc3"] = docx
+        fake.update("doc1", docx)
+        fake.remove("doc2")
+        fake.update("other", docx)
+        fake.calls.clear()
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0)) # a later run
+        teleporter = teleport()
+        assert teleporter.uploaded == 2 # doc1 changed, doc3 retried
+        assert fake.calls["export"] == 2
+        assert sorted(page["path"] for page in wiki.pages.values()) == \
+            ["mirror/team/doc_0", "mirror/team/doc_1", "mirror/team/doc_3"]
+
+
+def test_teleport_moves(tmp_path):
+    docx = Path("tests/resources/test.docx").read_bytes()
+    fake = FakeDrive()
+    fake.add_folder("root", "My Drive")
+    fake.add_folder("team", "team", "root")
+    for i in range(3):
+        fake.add(f"doc{i}", f"doc {i}", "team", content=docx)
+
+    def teleport():
+        drive = fake_drive(tmp_path, fake, cache=False)
+        teleporter = Teleporter(drive, db, export_workers=2, processes=1, upload_workers=2, changes=True)
+        teleporter.run("team", "mirror")
+        return teleporter
+
+    with StandinWiki() as wiki:
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0))
+        teleport()
+        assert len(wiki.pages) == 3
+
+        fake.move("doc1", parent="root") # out of the mirrored folder
+        fake.move("doc2", name="renamed")
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0)) # a later run
+        teleporter = teleport()
+        assert teleporter.uploaded == 1
+        assert sorted(page["path"] for page in wiki.pages.values()) == ["mirror/team/doc_0", "mirror/team/renamed"]
@@ -0,0 +1,102 @@
+# Tests for the wiki transport policy: rate limit, retry/backoff, AIMD concurrency
+import time
+
+import pytest
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+from wikinator.throttle import (
+    AIMDLimiter,
+    Backoff,
+    RetryableError,
+    TokenBucket,
+    TransportPolicy,
+)
+
+
+def flaky(failures:list[Exception], result="ok"):
+    """Build a function that raises each of `failures` in turn, then returns `result`"""
+    calls = []
+    def func():
+        calls.append(1)
+        if failures:
+            raise failures.pop(0)
+        return result
+    return func, calls
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, burst=2)
+    # burst is free
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.005
+
+
+def test_backoff_bounds():
+    backoff = Backoff(base=1.0, cap=4.0)
+    for attempt in range(10):
+        delay = backoff.delay(attempt)
+        assert 0 <= delay <= min(4.0, 2 ** attempt)
+
+
+def test_aimd_limiter():
+    limiter = AIMDLimiter(initial=8, minimum=1, maximum=10, latency_target=1.0)
+
+    limiter.acquire()
+    limiter.release(latency=5.0) # slow
+    assert limiter.limit == 4
+
+    limiter.acquire()
+    limiter.release(latency=0.1, ok=False) # failed
+    assert limiter.limit == 2
+
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release(latency=0.1)
+    assert limiter.limit == 10
+    assert limiter.in_flight == 0
+
+
+def test_aimd_one_decrease_per_window():
+    limiter = AIMDLimiter(initial=8, minimum=1, maximum=16, latency_target=1.0)
+    tickets = [limiter.acquire() for _ in range(8)]
+    for ticket in tickets:
+        limiter.release(latency=5.0, ticket=ticket) # all slow, from one congestion event
+    assert limiter.limit == 4
+
+    # a request sent after the decrease can decrease it again
+    limiter.release(latency=5.0, ok=False, ticket=limiter.acquire())
+    assert limiter.limit == 2
+
+
+def test_policy_retries_server_errors():
+    policy = TransportPolicy(rate=0, base_delay=0, retries=3)
+    func, calls = flaky([TransportServerError("bad gateway", 502), RetryableError("throttled", 429, 0)])
+
+    assert policy.call(func) == "ok"
+    assert len(calls) == 3
+    assert policy.stats["retries"] == 2
+
+
+def test_policy_gives_up():
+    policy = TransportPolicy(rate=0, base_delay=0, retries=2)
+    func, calls = flaky([TransportServerError("unavailable", 503)] * 5)
+
+    with pytest.raises(TransportServerError):
+        policy.call(func)
+    assert len(calls) == 3
+    assert policy.stats["failures"] == 1
+
+
+def test_policy_no_retry_on_query_error():
+    policy = TransportPolicy(rate=0, base_delay=0, retries=3)
+    func, calls = flaky([TransportQueryError("bad query"), TransportServerError("not found", 404)])
+
+    with pytest.raises(TransportQueryError):
+        policy.call(func)
+    with pytest.raises(TransportServerError):
+        policy.call(func)
+    assert len(calls) == 2
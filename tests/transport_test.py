@@ -0,0 +1,53 @@
+# Tests for compressed GraphQL request bodies
+import gzip
+
+from tests.standin import StandinWiki
+from wikinator.page import Page
+from wikinator.throttle import TransportPolicy
+from wikinator.transport import Compression
+from wikinator.wiki import GraphDB
+
+
+def big_page(path:str) -> Page:
+    # like a page with an embedded base64 image: large and fairly compressible
+    content = "# Big\n\n" + "[image1]: <data:image/png;base64," + ("iVBORw0KGgoAAAANSUhEUgAA" * 5000) + ">\n"
+    return Page.load({"content": content, "path": path, "title": "Big", "description": ""})
+
+
+def test_threshold():
+    compression = Compression("gzip", threshold=1000)
+    data, encoding = compression.encode(b"{}")
+    assert data == b"{}"
+    assert encoding is None
+
+    body = b'{"content": "' + b"a" * 5000 + b'"}'
+    data, encoding = compression.encode(body)
+    assert encoding == "gzip"
+    assert gzip.decompress(data) == body
+    assert compression.saved > 0
+    assert compression.stats["compressed"] == 1
+
+
+def test_compressed_upload():
+    with StandinWiki() as wiki:
+        compression = Compression("deflate")
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0), compression=compression)
+        page = big_page("big")
+        db.update(page)
+
+        assert wiki.by_path("big")["content"] == page.content
+        assert wiki.stats["compressed"] == 1
+        assert compression.saved > len(page.content) / 2
+
+
+def test_server_without_compression():
+    with StandinWiki(compression=False) as wiki:
+        compression = Compression("gzip")
+        db = GraphDB(wiki.url, "token", TransportPolicy(rate=0), compression=compression)
+        db.update(big_page("big"))
+        db.update(big_page("bigger"))
+
+        assert wiki.by_path("big") is not None
+        assert wiki.by_path("bigger") is not None
+        assert not compression.supported
+        assert compression.stats["compressed"] == 1 # only the first attempt
@@ -0,0 +1,35 @@
+# Tests for writing local copies of converted pages
+import os
+
+from wikinator.page import Page
+from wikinator.writer import PageWriter, write_if_changed
+
+
+def test_write_if_changed(tmp_path):
+    target = tmp_path / "a" / "b" / "page.md"
+    assert write_if_changed(target, "# one\n")
+    assert target.read_text() == "# one\n"
+    mtime = os.stat(target).st_mtime_ns
+
+    assert not write_if_changed(target, "# one\n")
+    assert os.stat(target).st_mtime_ns == mtime
+
+    assert write_if_changed(target, b"# two\n")
+    assert target.read_text() == "# two\n"
+    assert sorted(os.listdir(target.parent)) == ["page.md"] # no temp files left
+
+
+def test_page_writer(tmp_path):
+    pages = [Page.load({"content": f"page {i}\n", "path": f"docs/sub{i % 3}/page{i}", "title": "t", "description": ""})
+             for i in range(20)]
+    with PageWriter(str(tmp_path), workers=3, max_pending=4) as writer:
+        for page in pages:
+            writer.write(page)
+    assert writer.stats == {"written": 20, "unchanged": 0, "failed": 0}
+    assert (tmp_path / "docs" / "sub1" / "page4.md").read_text() == "page 4\n"
+
+    pages[0].content = "changed\n"
+    with PageWriter(str(tmp_path)) as writer:
+        for page in pages:
+            writer.write(page)
+    assert writer.stats == {"written": 1, "unchanged": 19, "failed": 0}